@@ -0,0 +1,259 @@
+'''
+    ai_player.py implements computer players for hanabi.Game.
+
+    An AI seat sees what a human in its seat would see: the other hands,
+    the table, the discards and the hints given (see Game.card_knowledge()).
+    To choose a move it runs a flat Monte Carlo search over forked games.
+    Each round it deals itself a hand consistent with what it knows
+    (a "determinization"), and for every legal move it forks that game,
+    makes the move and plays the game out with a simple rollout policy.
+    The move with the best mean final score wins. Rounds are run until the
+    time budget is spent. A few rounds say little about a blind play, so
+    plays are only searched when the card is likely to be playable given
+    the cards the AI can not see (and certain to be when one more storm
+    would end the game).
+
+    The rollout policy only uses each player's knowledge: play a card known
+    to be playable, else hint a playable card to someone who does not know
+    it yet, else discard the oldest card. That way hints are worth
+    something in the rollouts and AI seats give hints to their human
+    partners.
+
+    The search is CPU bound, so AIPool runs it in worker processes, which
+    keeps the bot's IRC thread (and the GIL) free for human players. A
+    worker is sent the game as a Game.save() record and rebuilds it with
+    Game.load(). The bot's other searches, !maxscore and the endgame
+    analysis (see SEARCHES), run in the same workers for the same reason.
+'''
+import logging
+import multiprocessing
+import Queue
+import random
+import time
+
+from endgame import analyze
+from hanabi import Game, Card, COLORS, RANKS, MOVE_PLAY, MOVE_DISCARD, \
+    MOVE_HINT_COLOR, MOVE_HINT_NUMBER, encode_move, decode_move
+from solver import max_score
+
+log = logging.getLogger(__name__)
+
+# AI seats are named AI_PREFIX + a number. A '.' can not be in an IRC nick,
+# so an AI seat can not be mistaken for a real user.
+AI_PREFIX = 'ai.'
+
+def is_ai(nick):
+    return nick.startswith(AI_PREFIX)
+
+def rollout_move(game, nick):
+    '''The rollout policy: an encoded move for nick using only what nick
+    can know.'''
+    playable = game.playable_mask()
+    p = game._players[nick]
+    for i, c in enumerate(p.hand):
+        if not p.knowledge[c.mark] & ~playable:
+            return encode_move(MOVE_PLAY, 0, i)
+
+    if game.notes:
+        for target in xrange(1, len(game.turn_order)):
+            other = game._players[game.turn_order[target]]
+            for c in other.hand:
+                if playable >> c.code & 1 and other.knowledge[c.mark] & ~playable:
+                    # say the number if the color is already known. The
+                    # color said is the first whose hint touches the card
+                    # (see Suit.touched_by).
+                    if other.knowledge[c.mark] & ~(((1 << RANKS) - 1) << (c.code // RANKS * RANKS)):
+                        for color, name in zip(game.rules.color_indexes, game.rules.colors):
+                            if game.rules.hint_masks[name] >> c.code & 1:
+                                return encode_move(MOVE_HINT_COLOR, target, color)
+
+                    return encode_move(MOVE_HINT_NUMBER, target, c.code % RANKS + 1)
+
+    return encode_move(MOVE_DISCARD, 0, 0)
+
+def rollout(game, max_moves=200):
+    '''Play game out with the rollout policy. Returns the final score.'''
+    for i in xrange(max_moves):
+        if game.game_over():
+            break
+
+        game.apply(rollout_move(game, game.turn_order[0]))
+
+    return game.score()
+
+# a play is searched only if the card is at least this likely to be playable.
+min_play_odds = 0.6
+
+def unseen_cards(game, nick):
+    '''Return the number of copies of each card, by code, nick can not
+    see: the cards in nick's hand and in the deck.'''
+    return list(game.unseen[nick])
+
+def play_odds(game, nick):
+    '''Return, for each card in nick's hand, the chance it is playable.'''
+    return [game.card_odds(nick, i)[1] for i in xrange(len(game._players[nick].hand))]
+
+def determinize(game, nick, rng, unseen=None):
+    '''Return a fork of game in which nick's hand and the deck are dealt
+    at random from the cards nick can not see, consistent with the hints
+    nick was given.'''
+    unseen = unseen if unseen else unseen_cards(game, nick)
+    pool = [code for code, n in enumerate(unseen) for i in xrange(n)]
+    hand = game._players[nick].hand
+    knowledge = game._players[nick].knowledge
+    g = game.fork()
+    for attempt in xrange(20):
+        left = list(pool)
+        codes = [None] * len(hand)
+        # most constrained cards first.
+        order = sorted(xrange(len(hand)), key=lambda i: bin(knowledge[hand[i].mark]).count('1'))
+        for i in order:
+            mask = knowledge[hand[i].mark] if attempt < 19 else -1
+            choices = [j for j, code in enumerate(left) if mask >> code & 1]
+            if not choices:
+                break
+
+            j = rng.choice(choices)
+            codes[i] = left[j]
+            left[j] = left[-1]
+            left.pop()
+        else:
+            break
+
+    p = g._players[nick]
+    p.hand = [Card.from_code(code, c.mark) for code, c in zip(codes, hand)]
+    rng.shuffle(left)
+    g.deck = [Card.from_code(code) for code in left[:len(game.deck)]]
+    return g
+
+def choose_move(game, nick, budget_ms=500, rng=None):
+    '''Return the encoded move nick should make, searching for about
+    budget_ms milliseconds. Always runs at least one round.'''
+    rng = rng if rng else random.Random()
+    moves = game.legal_moves(nick)
+    if not moves:
+        return None
+
+    unseen = unseen_cards(game, nick)
+    odds = play_odds(game, nick)
+    need = 1.0 if game.storms >= game.max_storms - 1 else min_play_odds
+    moves = [m for m in moves if m >> 8 != MOVE_PLAY or odds[m & 31] >= need]
+
+    deadline = time.time() + budget_ms / 1000.0
+    totals = dict((m, 0) for m in moves)
+    rounds = 0
+    while not rounds or time.time() < deadline:
+        world = determinize(game, nick, rng, unseen)
+        for m in moves:
+            g = world.fork()
+            g.apply(m)
+            totals[m] += rollout(g)
+
+        rounds += 1
+
+    # ties go to the rollout policy's own choice.
+    default = rollout_move(game, nick)
+    best = max(moves, key=lambda m: (totals[m], m == default))
+    log.debug('%s chose %s after %d rounds', nick, decode_move(best), rounds)
+    return best
+
+def move_command(game, nick, move):
+    '''Return the Game method and arguments for an encoded move, like
+    ('play_card', (nick, mark)).'''
+    kind, target, value = decode_move(move)
+    if kind == MOVE_PLAY:
+        return 'play_card', (nick, game._players[nick].hand[value].mark)
+    elif kind == MOVE_DISCARD:
+        return 'discard_card', (nick, game._players[nick].hand[value].mark)
+
+    hint = COLORS[value] if kind == MOVE_HINT_COLOR else value
+    return 'hint_player', (nick, game.turn_order[target], hint)
+
+def ai_policy(game, nick, rng):
+    '''choose_move() as a simulate.py policy, with a short budget.'''
+    method, args = move_command(game, nick, choose_move(game, nick, 50, rng))
+    if method == 'hint_player':
+        return ('hint',) + args[1:]
+
+    return (method.split('_')[0], args[1])
+
+def _decide(args):
+    '''Worker entry point. Always returns a result, as the pool drops a
+    task that raises without a word and the game would wait on the AI for
+    good. If the search fails the move is the first discard, if the game
+    could be loaded at all, else None, which makes the bot ask again.'''
+    key, record, nick, budget_ms, seed = args
+    game = None
+    try:
+        game = Game.load(record)
+        return key, choose_move(game, nick, budget_ms, random.Random(seed))
+    except Exception:
+        log.exception('AI move for %s failed', nick)
+
+    try:
+        discards = [m for m in game.legal_moves(nick) if m >> 8 == MOVE_DISCARD] if game else []
+    except Exception:
+        log.exception('No fallback AI move for %s', nick)
+        discards = []
+
+    return key, discards[0] if discards else None
+
+# searches AIPool.search() runs by name: function(game, time_limit=...).
+SEARCHES = {
+    'maxscore': max_score,
+    'endgame': analyze,
+}
+
+def _search(args):
+    '''Worker entry point for SEARCHES. The result is None if the search
+    failed.'''
+    key, name, record, time_limit = args
+    try:
+        return key, SEARCHES[name](Game.load(record), time_limit=time_limit)
+    except Exception:
+        log.exception('%s search failed', name)
+        return key, None
+
+class AIPool(object):
+    '''Worker processes that choose moves for AI seats.
+
+    submit() hands a game to a worker and returns at once. When the worker
+    is done, (key, move) shows up in results(), which the bot polls from
+    its own thread. key is whatever the caller needs to find the game
+    again and check the move is still wanted.
+
+    search() runs one of SEARCHES the same way, its (key, result) showing
+    up in search_results().'''
+    def __init__(self, processes=1, budget_ms=500):
+        self.budget_ms = budget_ms
+        self._done = Queue.Queue()
+        self._searched = Queue.Queue()
+        self._pool = multiprocessing.Pool(processes)
+
+    def submit(self, key, game, nick):
+        self._pool.apply_async(_decide, ((key, game.save(), nick, self.budget_ms,
+                                          random.getrandbits(32)),),
+                               callback=self._done.put)
+
+    def search(self, key, name, game, time_limit):
+        self._pool.apply_async(_search, ((key, name, game.save(), time_limit),),
+                               callback=self._searched.put)
+
+    def results(self):
+        '''Return the (key, move) results that are ready.'''
+        return self._ready(self._done)
+
+    def search_results(self):
+        '''Return the (key, result) search results that are ready.'''
+        return self._ready(self._searched)
+
+    def _ready(self, done):
+        ready = []
+        while True:
+            try:
+                ready.append(done.get_nowait())
+            except Queue.Empty:
+                return ready
+
+    def close(self):
+        self._pool.terminate()
@@ -0,0 +1,236 @@
+'''
+    batch.py implements a Hanabi engine that plays K games in lockstep.
+
+    All game state is held in NumPy arrays with the games along the first
+    axis, and one call to BatchGame.step() applies one action to every
+    game at once. The rules are the same as hanabi.Game's play_card,
+    discard_card and hint_player; there is no text output at all.
+
+    Players are numbered by turn order: player 0 moves first, then 1, and
+    so on. Hand slots are 0-based positions in the hand, and like
+    hanabi.Game a played or discarded card is removed from its slot, the
+    cards to its right slide left and the new card is drawn into the last
+    slot.
+
+    This module needs numpy, which is not required by the rest of HanabIRC.
+
+    Example:
+        >>> import numpy as np
+        >>> b = BatchGame.from_seeds(range(1000), num_players=3)
+        >>> kinds = np.full(1000, BatchGame.DISCARD)
+        >>> valid = b.step(kinds, slot=np.zeros(1000, dtype=int))
+        >>> bool(valid.all())
+        True
+'''
+import numpy as np
+
+from hanabi import RANKS, deck_codes
+from variants import rules
+
+class BatchGame(object):
+    # action kinds
+    PLAY, DISCARD, HINT_COLOR, HINT_NUMBER = range(4)
+
+    def __init__(self, decks, num_players, game_type='standard', deck_len=None, deal=True):
+        '''decks is a (K, D) array of card codes in the order they are dealt
+        and drawn. game_type names the variant (see variants.py) the limits
+        and hints come from. Unless deal is False, each player in turn order is dealt a
+        full hand from the front of the deck. If the decks are of different lengths, pad with -1
+        and give deck_len.'''
+        decks = np.asarray(decks, dtype=np.int8)
+        K, D = decks.shape
+        self.rules = rules(game_type)
+        self.num_games = K
+        self.num_players = num_players
+        self.num_colors = num_colors = len(self.rules.colors)
+        self.hand_size = self.rules.hand_size(num_players)
+        self.max_score = self.rules.max_score
+        self.max_notes = self.rules.max_notes
+        self.max_storms = self.rules.max_storms
+
+        # touches[h, c] is True if a hint of color h touches the cards of
+        # color c.
+        self.touches = np.array([[bool(self.rules.hint_masks[h] & (1 << (c * RANKS)))
+                                  for c in xrange(num_colors)] for h in self.rules.colors])
+
+        self.decks = decks
+        self.deck_len = (np.full(K, D, dtype=np.int16) if deck_len is None
+                         else np.asarray(deck_len, dtype=np.int16))
+
+        # hands[k, p, i] is the card in slot i of player p, -1 if empty.
+        H = self.hand_size
+        if deal:
+            dealt = num_players * H
+            self.hands = decks[:, :dealt].reshape(K, num_players, H).copy()
+            self.hand_len = np.full((K, num_players), H, dtype=np.int8)
+            self.deck_ptr = np.full(K, dealt, dtype=np.int16)
+        else:
+            self.hands = np.full((K, num_players, H), -1, dtype=np.int8)
+            self.hand_len = np.zeros((K, num_players), dtype=np.int8)
+            self.deck_ptr = np.zeros(K, dtype=np.int16)
+
+        self.table = np.zeros((K, num_colors), dtype=np.int8)
+        self.discards = np.zeros((K, num_colors * RANKS), dtype=np.int8)
+        self.notes = np.full(K, self.max_notes, dtype=np.int8)
+        self.storms = np.zeros(K, dtype=np.int8)
+        self.turn = np.zeros(K, dtype=np.int8)
+
+        # -1 until the deck runs out, then counts turns as Game.last_round does.
+        self.last_round = np.full(K, -1, dtype=np.int8)
+        self.done = np.zeros(K, dtype=bool)
+
+    @classmethod
+    def from_seeds(cls, seeds, num_players, rainbow=None):
+        '''Shuffle a deck for each seed. rainbow may be None, 5 or 10.
+        Note that the shuffles are NumPy's, so a seed does not give the same
+        deal here as it does in hanabi.Game.'''
+        deck = np.array(deck_codes('rainbow %d' % rainbow if rainbow else 'standard'),
+                        dtype=np.int8)
+        decks = np.array([np.random.RandomState(s).permutation(deck) for s in seeds])
+        return cls(decks, num_players, 'rainbow %d' % rainbow if rainbow else 'standard')
+
+    @classmethod
+    def from_games(cls, games):
+        '''Build a batch from the current state of started hanabi.Game
+        instances. The games must have the same number of players and the
+        same variant. Player p of the batch is game.turn_order[p].'''
+        num_players = len(games[0].turn_order)
+        D = max(max(len(g.deck) for g in games), 1)
+        K = len(games)
+
+        b = cls(np.full((K, D), -1), num_players, games[0].rules.name, deal=False)
+        num_colors = b.num_colors
+        for k, g in enumerate(games):
+            for p, nick in enumerate(g.turn_order):
+                hand = [c.code for c in g._players[nick].hand]
+                b.hands[k, p, :len(hand)] = hand
+                b.hand_len[k, p] = len(hand)
+
+            b.decks[k, :len(g.deck)] = [c.code for c in g.deck]
+            b.deck_len[k] = len(g.deck)
+            b.table[k] = g.table[:num_colors]
+            b.discards[k] = g.discards[:num_colors * RANKS]
+            b.notes[k] = g.notes
+            b.storms[k] = g.storms
+            b.last_round[k] = -1 if g.last_round is None else g.last_round
+            b.done[k] = g.game_over()
+
+        return b
+
+    def score(self):
+        '''Score of each game.'''
+        return np.where(self.storms >= self.max_storms, 0,
+                        self.table.sum(axis=1, dtype=np.int16))
+
+    def current_hands(self):
+        '''(K, H) array of the hands of the players whose turn it is.'''
+        return self.hands[np.arange(self.num_games), self.turn]
+
+    def is_valid_play(self, cards):
+        '''Game._is_valid_play for an array of card codes, one per game.'''
+        rows = np.arange(len(cards))
+        return (cards >= 0) & (self.table[rows, cards // RANKS] + 1 == cards % RANKS + 1)
+
+    def is_game_over(self):
+        '''Game._is_game_over for every game.'''
+        return ((self.last_round == self.num_players) |
+                (self.table.sum(axis=1) == self.max_score) |
+                (self.storms >= self.max_storms))
+
+    def step(self, kinds, slot=None, target=None, value=None):
+        '''Apply one action to every game. kinds is an array of action
+        kinds. For PLAY and DISCARD slot gives the hand slot. For hints,
+        target is the offset in turn order of the hinted player (1 is the
+        next player) and value is the color index or the number.
+
+        Games that are over are left alone. Returns a bool array that is
+        True where the action was legal and taken. As in hanabi.Game an
+        illegal action does not use up the turn.'''
+        K = self.num_games
+        rows = np.arange(K)
+        kinds = np.asarray(kinds)
+        zeros = np.zeros(K, dtype=int)
+        slot = zeros if slot is None else np.asarray(slot)
+        target = zeros if target is None else np.asarray(target)
+        value = zeros if value is None else np.asarray(value)
+
+        active = ~self.done
+        hand_len = self.hand_len[rows, self.turn]
+        is_card = (kinds == self.PLAY) | (kinds == self.DISCARD)
+        card_ok = is_card & (slot >= 0) & (slot < hand_len)
+        card = np.where(card_ok, self.hands[rows, self.turn, np.clip(slot, 0, self.hand_size-1)], -1)
+
+        # hints need a note, another player and a color or number that exists.
+        is_color = kinds == self.HINT_COLOR
+        is_number = kinds == self.HINT_NUMBER
+        hint_ok = (((is_color & (value >= 0) & (value < self.num_colors)) |
+                    (is_number & (value >= 1) & (value <= RANKS))) &
+                   (target % self.num_players != 0) & (self.notes > 0))
+
+        valid = active & (card_ok | hint_ok)
+
+        # plays
+        play = valid & (kinds == self.PLAY)
+        success = play & self.is_valid_play(card)
+        color = np.where(card >= 0, card // RANKS, 0)
+        self.table[rows[success], color[success]] += 1
+        bonus = success & (card % RANKS == RANKS - 1) & (self.notes < self.max_notes)
+        self.notes[bonus] += 1
+        misplay = play & ~success
+        self.storms[misplay & (self.storms < self.max_storms)] += 1
+
+        # discards, including misplays
+        discard = valid & (kinds == self.DISCARD)
+        to_pile = discard | misplay
+        self.discards[rows[to_pile], card[to_pile]] += 1
+        self.notes[discard & (self.notes < self.max_notes)] += 1
+
+        # hints just use a note.
+        hint = valid & hint_ok
+        self.notes[hint] -= 1
+
+        # remove played and discarded cards and draw.
+        used = valid & card_ok
+        if used.any():
+            self._draw(rows[used], self.turn[used], slot[used])
+
+        # end of turn.
+        self.turn[valid] = (self.turn[valid] + 1) % self.num_players
+        empty = valid & (self.deck_ptr >= self.deck_len)
+        self.last_round[empty] += 1
+        self.done |= self.is_game_over()
+        return valid
+
+    def hint_matches(self, target, value, kinds):
+        '''(K, H) bool array of the cards a hint would touch, for building
+        knowledge outside the engine.'''
+        rows = np.arange(self.num_games)
+        hands = self.hands[rows, (self.turn + target) % self.num_players]
+        is_color = (kinds == self.HINT_COLOR)[:, None]
+        colors = np.where(kinds == self.HINT_COLOR, value, 0)
+        touched = self.touches[colors[:, None], np.maximum(hands, 0) // RANKS]
+        numbers = np.where(kinds == self.HINT_NUMBER, value, -2)[:, None]
+        return (hands >= 0) & ((is_color & touched) | (hands % RANKS + 1 == numbers))
+
+    def _draw(self, rows, players, slots):
+        '''Remove the card in slots from the hands and draw a new card into
+        the last slot.'''
+        n = len(rows)
+        H = self.hand_size
+        pos = np.arange(H)
+        src = np.minimum(pos[None, :] + (pos[None, :] >= slots[:, None]), H - 1)
+        hands = self.hands[rows, players]
+        hands = hands[np.arange(n)[:, None], src]
+
+        last = self.hand_len[rows, players] - 1
+        has_card = self.deck_ptr[rows] < self.deck_len[rows]
+        drawn = np.where(has_card, self.decks[rows, np.minimum(self.deck_ptr[rows],
+                                                               self.decks.shape[1] - 1)], -1)
+        hands[np.arange(n), last] = drawn
+        self.hands[rows, players] = hands
+        self.deck_ptr[rows] += has_card
+        self.hand_len[rows[~has_card], players[~has_card]] -= 1
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,164 @@
+'''
+    bot_stats.py keeps counters and latency histograms for Hanabot, so a
+    slow bot can be tracked down to the engine, the output rate limiter or
+    the network.
+
+    For every command it counts calls and keeps two histograms: engine
+    time (the whole handler less the time spent sending) and output time
+    (handing the response to the output queue, see transport.py). It also
+    counts messages in and lines out per channel and the depth of the
+    output queue: the lines waiting to be sent once a response is queued.
+
+    Histograms have log2 buckets: bucket i counts samples below 2**i
+    microseconds (or 2**i lines for the queue depth), so adding a sample
+    is O(1) and the memory used is fixed.
+'''
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+# bucket i holds samples < 2**i. The last bucket holds everything larger.
+num_buckets = 28
+
+def _us_string(us):
+    if us < 1000:
+        return '%dus' % us
+    elif us < 1000000:
+        return '%dms' % (us // 1000)
+
+    return '%.1fs' % (us / 1e6)
+
+class Histogram(object):
+    __slots__ = ('counts', 'n', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * num_buckets
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        '''value is a non-negative int.'''
+        self.counts[min(value.bit_length(), num_buckets-1)] += 1
+        self.n += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        '''Return the upper bound of the bucket holding the p-th percentile.'''
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if self.n and seen >= self.n * p / 100.0:
+                return 2 ** i
+
+        return 0
+
+    def mean(self):
+        return self.total / float(self.n) if self.n else 0.0
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean(), 'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99), 'buckets': self.counts}
+
+    def time_string(self):
+        '''Summary of a histogram of microseconds.'''
+        return 'p50 <%s, p90 <%s, max %s' % (
+            _us_string(self.percentile(50)), _us_string(self.percentile(90)),
+            _us_string(self.max))
+
+class CommandStats(object):
+    __slots__ = ('count', 'engine', 'output')
+
+    def __init__(self):
+        self.count = 0
+        self.engine = Histogram()
+        self.output = Histogram()
+
+class BotStats(object):
+    def __init__(self):
+        self.started = time.time()
+        self.commands = defaultdict(CommandStats)
+        # channel -> messages in, lines out
+        self.messages_in = defaultdict(int)
+        self.lines_out = defaultdict(int)
+        self.queue_depth = Histogram()
+
+        # the command being timed: [name, start time, output seconds]
+        self._current = None
+
+    def message_in(self, channel):
+        self.messages_in[channel] += 1
+
+    def command_start(self, name):
+        self._current = [name, time.time(), 0.0]
+
+    def command_end(self):
+        if not self._current:
+            return
+
+        name, start, output = self._current
+        self._current = None
+        total = time.time() - start
+        stats = self.commands[name]
+        stats.count += 1
+        stats.engine.add(int(1e6 * max(total - output, 0)))
+        stats.output.add(int(1e6 * output))
+
+    def output(self, channel, lines, seconds):
+        '''lines were sent for channel, which took seconds.'''
+        self.lines_out[channel] += lines
+        if self._current:
+            self._current[2] += seconds
+
+    def queued(self, depth):
+        '''depth lines are waiting to be sent.'''
+        self.queue_depth.add(depth)
+
+    def report(self):
+        '''Return the stats as lines of text.'''
+        lines = ['Stats for the last %s: %d commands.' % (
+            _us_string(int(1e6 * (time.time() - self.started))),
+            sum(s.count for s in self.commands.itervalues()))]
+
+        for name, s in sorted(self.commands.iteritems(), key=lambda x: -x[1].count):
+            lines.append('!%s: %d calls. engine %s. output %s.' % (
+                name, s.count, s.engine.time_string(), s.output.time_string()))
+
+        for chan in sorted(set(self.messages_in) | set(self.lines_out)):
+            lines.append('%s: %d messages in, %d lines out.' % (
+                chan, self.messages_in[chan], self.lines_out[chan]))
+
+        q = self.queue_depth
+        lines.append('Output queue depth: p50 <%d, p90 <%d, max %d lines.' % (
+            q.percentile(50), q.percentile(90), q.max))
+        return lines
+
+    def to_dict(self):
+        return {
+            'started': self.started,
+            'time': time.time(),
+            'commands': dict((name, {'count': s.count, 'engine_us': s.engine.to_dict(),
+                                     'output_us': s.output.to_dict()})
+                             for name, s in self.commands.iteritems()),
+            'messages_in': dict(self.messages_in),
+            'lines_out': dict(self.lines_out),
+            'queue_depth': self.queue_depth.to_dict(),
+        }
+
+    def dump(self, path):
+        '''Write the stats to path as JSON.'''
+        tmp = '%s.tmp' % path
+        try:
+            with open(tmp, 'w') as fd:
+                json.dump(self.to_dict(), fd, indent=1, sort_keys=True)
+
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            log.error('Unable to write stats to %s: %s', path, e)
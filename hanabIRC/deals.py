@@ -0,0 +1,140 @@
+'''
+    deals.py shuffles decks subject to constraints and keeps a bank of
+    deals made ahead of time.
+
+    A deal is the order of a deck: position 0 is dealt first and position
+    -1, the bottom of the deck, is drawn last. This module does not know
+    what the cards are, it only moves them around. hanabi.py knows which
+    positions make up which hand and what makes a card critical, and
+    builds the constraints from that.
+
+    Constraints are declared, not checked after the fact:
+        Forbid(positions, test) - no card for which test(card) is True may
+            be at any of the positions.
+        Require(positions, test) - at least one card for which test(card)
+            is True must be at one of the positions.
+
+    deal() meets all of them in a single pass over the deck: the
+    constrained positions are filled first from the cards allowed there,
+    then the rest of the deck is shuffled into the remaining positions.
+    Nothing is ever reshuffled and thrown away, so adding constraints does
+    not make dealing slower. With a single Forbid position the deal is
+    uniform over all valid deals. A Require slightly favors deals with more
+    than one matching card.
+'''
+import logging
+import random
+import threading
+from collections import namedtuple, deque
+
+log = logging.getLogger(__name__)
+
+Forbid = namedtuple('Forbid', 'positions test')
+Require = namedtuple('Require', 'positions test')
+
+def deal(rng, cards, constraints=()):
+    '''Return a shuffled copy of cards that meets constraints, using the
+    random.Random instance rng. Raises ValueError if the constraints
+    cannot be met.'''
+    free = list(cards)
+    n = len(free)
+    deck = [None] * n
+
+    # position -> tests of cards that may not go there.
+    forbid = dict()
+    requires = []
+    for con in constraints:
+        if isinstance(con, Forbid):
+            for p in con.positions:
+                forbid.setdefault(p % n, []).append(con.test)
+        else:
+            requires.append(con)
+
+    def place(p, test):
+        choices = [i for i, c in enumerate(free) if test(c) and
+                   not any(t(c) for t in forbid.get(p, ()))]
+        if not choices:
+            raise ValueError('No card can be dealt to position %d.' % p)
+
+        i = rng.choice(choices)
+        deck[p] = free[i]
+        free[i] = free[-1]
+        free.pop()
+
+    for req in requires:
+        positions = [p % n for p in req.positions]
+        if any(deck[p] is not None and req.test(deck[p]) for p in positions):
+            continue
+
+        open_positions = [p for p in positions if deck[p] is None]
+        if not open_positions:
+            raise ValueError('No position left for a required card.')
+
+        place(rng.choice(open_positions), req.test)
+
+    # most constrained positions first.
+    for p in sorted(forbid, key=lambda p: -len(forbid[p])):
+        if deck[p] is None:
+            place(p, lambda c: True)
+
+    rng.shuffle(free)
+    rest = iter(free)
+    return [c if c is not None else next(rest) for c in deck]
+
+class DealBank(object):
+    '''Deals made ahead of time, by kind of deal.
+
+    make_deal(seed, spec) returns the deal for a seed and a spec, any
+    hashable description of the kind of deal. The bank only changes when
+    the work is done: a background thread keeps depth deals of each spec
+    it has been asked for (or given at creation) ready, so take() returns
+    at once.
+
+    Each deal comes with its seed, and make_deal(seed, spec) returns the
+    same deal again, so games dealt from the bank can still be replayed
+    from their seed alone.'''
+    def __init__(self, make_deal, depth=4, specs=None):
+        self._make_deal = make_deal
+        self._depth = depth
+        self._cond = threading.Condition()
+        # spec -> deque of (seed, deal)
+        self._deals = dict((spec, deque()) for spec in specs or [])
+        self._seeds = random.SystemRandom()
+
+    def start(self):
+        '''Start filling the bank in a daemon thread.'''
+        t = threading.Thread(target=self._fill, name='DealBank')
+        t.daemon = True
+        t.start()
+
+    def take(self, spec):
+        '''Return (seed, deal) for spec. If none is ready, one is made now.'''
+        with self._cond:
+            ready = self._deals.setdefault(spec, deque())
+            item = ready.popleft() if ready else None
+            self._cond.notify()
+
+        if item is None:
+            log.info('No %s deal ready in the bank, dealing now.', str(spec))
+            seed = self._seeds.getrandbits(32)
+            item = (seed, self._make_deal(seed, spec))
+
+        return item
+
+    def ready(self, spec):
+        '''Return the number of deals ready for spec.'''
+        with self._cond:
+            return len(self._deals.get(spec, ()))
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                spec = next((s for s, d in self._deals.iteritems() if len(d) < self._depth), None)
+                if spec is None:
+                    self._cond.wait()
+                    continue
+
+            seed = self._seeds.getrandbits(32)
+            item = (seed, self._make_deal(seed, spec))
+            with self._cond:
+                self._deals[spec].append(item)
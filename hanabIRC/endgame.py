@@ -0,0 +1,69 @@
+'''
+    endgame.py analyzes the final round of a game of Hanabi, the turns
+    left once the deck is empty.
+
+    With the deck empty nothing is left to chance for someone who can see
+    every hand, and each player has at most one turn left, so the rest of
+    the game can be searched to the end. The search is solver.Solver's:
+    its transposition table shares the work between identical sub-states
+    (the same hands, table and notes reached by different moves). It is
+    bounded by a time limit so it can run in the bot's thread.
+
+    The result is the best final score and a line of moves that reaches
+    it. Each play in the line is checked against what the player knows
+    from the hints given so far: a card the player can not yet know to be
+    playable is marked, as it needs a hint (or luck) first.
+'''
+import logging
+from collections import namedtuple
+
+from hanabi import Card, RANKS
+from solver import Solver
+
+log = logging.getLogger(__name__)
+
+# score is the best final score. If exact is False the search ran out of
+# time, score is only the best found and line is empty. line is the moves
+# of a best line as text.
+Endgame = namedtuple('Endgame', 'score exact line')
+
+# the default bound on the search, in seconds.
+default_time_limit = 1.0
+
+def in_final_round(game):
+    return game.has_started() and not game.game_over() and game.last_round is not None
+
+def analyze(game, time_limit=default_time_limit):
+    '''Return the Endgame for game, or None if game is not in its final round.'''
+    if not in_final_round(game):
+        return None
+
+    solver = Solver(game, time_limit=time_limit)
+    score, exact = solver.solve()
+    line = describe(game, solver.best_line()) if exact else []
+    log.debug('endgame: %d (exact: %s) after %d states', score, exact, solver.nodes)
+    return Endgame(score, exact, line)
+
+def describe(game, line):
+    '''Return the moves of a Solver.best_line() line as text.'''
+    table = list(game.table)
+    moves = []
+    for turn, kind, code in line:
+        nick = game.turn_order[turn]
+        if kind == 2:
+            moves.append('%s hints' % nick)
+            continue
+
+        card = Card.from_code(code)
+        if kind == 1:
+            moves.append('%s discards %s' % (nick, card.front()))
+            continue
+
+        playable = sum(1 << (c * RANKS + h) for c, h in enumerate(table[:len(game.colors)])
+                       if h < RANKS)
+        p = game._players[nick]
+        known = any(c.code == code and not p.knowledge[c.mark] & ~playable for c in p.hand)
+        moves.append('%s plays %s%s' % (nick, card.front(), '' if known else ' (not yet hinted)'))
+        table[code // RANKS] += 1
+
+    return moves
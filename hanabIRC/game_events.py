@@ -0,0 +1,94 @@
+'''
+    game_events.py defines the events emitted by the hanabi.Game engine
+    and renders them as text.
+
+    The engine's state changing methods (Game._play, Game._discard and
+    Game._hint) return a list of events and do no formatting at all. The
+    public Game API passes the events to render(), which builds the
+    GameResponse shown to the players. Code that does not need text, like
+    replays and simulations, never renders anything.
+'''
+from collections import namedtuple
+
+from GameResponse import GameResponse as gr
+
+# nick played card. success is False for a misplay. finished is True if
+# the card completed its color group.
+CardPlayed = namedtuple('CardPlayed', 'nick card success finished')
+
+# nick discarded card.
+CardDiscarded = namedtuple('CardDiscarded', 'nick card')
+
+# nick drew a card from the deck.
+CardDrawn = namedtuple('CardDrawn', 'nick card')
+
+# nick gave player a hint. hint is a color name or a number, marks are the
+# marks of the cards the hint touched.
+HintGiven = namedtuple('HintGiven', 'nick player hint marks')
+
+# the turn is over and the table changed. The table is rendered from the
+# game when the event is rendered.
+TableState = namedtuple('TableState', 'game_over')
+
+# sent to the next player at the end of every turn.
+TURN_NOTICE = 'It is your turn in Hanabi.'
+
+def hint_string(event):
+    '''Return a HintGiven event as text.'''
+    nick, player, hint, marks = event
+    if not len(marks):
+        return '%s has given %s a hint: you have no %s cards' % (nick, player, str(hint))
+
+    plural = 's ' if len(marks) > 1 else ' '
+    is_are = 'are ' if len(marks) > 1 else 'is '
+    a = 'a ' if isinstance(hint, int) else ''
+    return '%s has given %s a hint: your card%s%s %s%s%s' % (
+        nick, player, plural, ', '.join(marks), is_are, a, str(hint))
+
+def render(game, events):
+    '''Return a GameResponse describing events, which happened in game.'''
+    retVal = gr()
+    last = None
+    for e in events:
+        if isinstance(e, CardPlayed):
+            if e.success:
+                retVal.public.append('%s successfully added %s to the %s group.' %
+                                     (e.nick, str(e.card), e.card.color))
+                if e.finished:
+                    retVal.public.append('Bonus for finishing %s group: one note '
+                                         'token recovered!' % e.card.color)
+            else:
+                retVal.public.append('%s guessed wrong with %s! One storm token '
+                                     'flipped up!' % (e.nick, str(e.card)))
+
+        elif isinstance(e, CardDiscarded):
+            retVal.public.append('%s has discarded %s' % (e.nick, str(e.card)))
+
+        elif isinstance(e, CardDrawn):
+            # the discard message is enough, only mention draws after a play.
+            if isinstance(last, CardPlayed):
+                retVal.public.append('%s drew a new card from the deck into his or '
+                                     'her hand.' % e.nick)
+
+        elif isinstance(e, HintGiven):
+            retVal.public.append('======== %s' % hint_string(e))
+
+        elif isinstance(e, TableState):
+            retVal.merge(game.get_table())
+            if 0 == len(game.deck):
+                retVal.public.append('Turns remaining in game: %d' % (
+                    len(game._players)-game.last_round))
+
+            if e.game_over:
+                retVal.merge(game._end_game())
+            else:
+                # tell the next player it is their turn.
+                s = TURN_NOTICE
+                if not game.notes:
+                    s += ' (Note: no hints remaining.)'
+
+                retVal.private[game.turn_order[0]].append(s)
+
+        last = e
+
+    return retVal
@@ -12,9 +12,12 @@ class game_history(object):
     max_last_games = 512
 
     @staticmethod
-    def add_game(score, players, game_type, channel):
+    def add_game(score, players, game_type, channel, record=None):
+        '''record is the game as saved by Game.save(), so it can be
+        replayed later.'''
         hist = game_history._get_hist()
-        hist['last_games'].append([time.time(), score, players, game_type, channel])
+        hist['last_games'].append([time.time(), score, players, game_type, channel,
+                                   record])
         # trim
         hist['last_games'][:] = hist['last_games'][-game_history.max_last_games:]
         game_history._put_hist(hist)
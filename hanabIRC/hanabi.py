@@ -28,29 +28,137 @@ import logging
 import random
 import string
 from GameResponse import GameResponse as gr
+from game_events import CardPlayed, CardDiscarded, CardDrawn, HintGiven, \
+    TableState, hint_string, render
 from text_markup import irc_markup
-from collections import defaultdict
+from deals import Forbid, Require, deal
+from variants import COLORS, RANKS, ABBREVS, rules, rules_for_options, OPTIONS
+from collections import defaultdict, OrderedDict, namedtuple, Counter
 
 log = logging.getLogger(__name__)
 
+# Card identities are small ints: color index * RANKS + (number - 1). The
+# color index is the position of the color in COLORS, so the five standard
+# colors encode to 0-24 and the rainbow cards to 25-29. See variants.py.
+_color_index = dict((c, i) for i, c in enumerate(COLORS))
+_code_color = [c for c in COLORS for n in xrange(RANKS)]
+_code_number = [n for c in COLORS for n in xrange(1, RANKS+1)]
+_code_front = ['%s%d' % (ABBREVS[c], n) for c in COLORS for n in xrange(1, RANKS+1)]
+
+# the order in which color groups are displayed on the table.
+_color_display_order = sorted(xrange(len(COLORS)), key=lambda i: COLORS[i])
+
+# bit of each card mark in the Player mark bitmasks.
+_mark_bit = dict((m, i) for i, m in enumerate(string.uppercase))
+
+def card_code(color, number):
+    '''Return the int encoding of the card with the given color and number.'''
+    return _color_index[color] * RANKS + number - 1
+
+# What a player knows about a card is kept as a possibility mask: bit code
+# is set if the card could be the card with that code.
+_color_masks = dict((c, ((1 << RANKS) - 1) << (i * RANKS)) for i, c in enumerate(COLORS))
+_number_masks = dict((n, sum(1 << (i * RANKS + n - 1) for i in xrange(len(COLORS))))
+                     for n in xrange(1, RANKS+1))
+
+def possible_cards(mask):
+    '''Return the codes of the cards set in a possibility mask.'''
+    return [code for code in xrange(len(COLORS) * RANKS) if mask >> code & 1]
+
+# A deal is given by its seed and a DealSpec: the game type, the number of
+# players and the names of the constraints on the deal (see
+# DEAL_CONSTRAINTS). Hands are dealt from the top of the deck in turn
+# order.
+DealSpec = namedtuple('DealSpec', 'game_type num_players constraints')
+
+def hand_size(num_players, game_type='standard'):
+    return rules(game_type).hand_size(num_players)
+
+def deck_codes(game_type):
+    '''Return the codes of the cards in the deck of a game type.'''
+    return list(rules(game_type).codes)
+
+def _no_critical_bottom(codes, spec):
+    '''The bottom card is not the only copy of a card below 5. Such a card
+    and the cards above it in its group could never be played.'''
+    counts = Counter(codes)
+    return Forbid([-1], lambda c: counts[c] == 1 and c % RANKS != RANKS - 1)
+
+def _playable_first_hand(codes, spec):
+    '''The first player has a 1.'''
+    return Require(range(hand_size(spec.num_players, spec.game_type)), lambda c: c % RANKS == 0)
+
+DEAL_CONSTRAINTS = {
+    'no_critical_bottom': _no_critical_bottom,
+    'playable_first_hand': _playable_first_hand,
+}
+
+def new_deal(seed, spec):
+    '''Return the deal, a list of card codes, for seed and spec.'''
+    rng = random.Random(seed)
+    # a stream of its own, so the deal does not depend on anything else
+    # done with the seed.
+    rng.jumpahead(1)
+    codes = deck_codes(spec.game_type)
+    return deal(rng, codes, [DEAL_CONSTRAINTS[name](codes, spec)
+                             for name in spec.constraints])
+
+# Moves are encoded as ints too: kind << 8 | target << 5 | value. For plays
+# and discards value is the hand slot and target is 0. For hints target is
+# the position of the hinted player in the turn order (1 is the next
+# player) and value is the color index or the number.
+MOVE_PLAY, MOVE_DISCARD, MOVE_HINT_COLOR, MOVE_HINT_NUMBER = range(4)
+
+def encode_move(kind, target, value):
+    return kind << 8 | target << 5 | value
+
+def decode_move(move):
+    '''Return (kind, target, value) of an encoded move.'''
+    return move >> 8, (move >> 5) & 7, move & 31
+
 class Card(object):
     '''
     Card has a color, a number, and a "mark". The mark is a char that 
     represents the card, think the image of the char on the back of the card.
+
+    The color and number are stored together as a single int, the card
+    code. See card_code().
     '''
-    markup = irc_markup()
+    __slots__ = ('code', 'mark')
+
+    # markup is shared by all cards.
+    _markup = irc_markup()
 
     def __init__(self, color, number, mark=None):
-        self.color = color
-        self.number = number
+        self.code = _color_index[color] * RANKS + number - 1
         self.mark = mark
-        self.markup = Card.markup
+
+    @classmethod
+    def from_code(cls, code, mark=None):
+        c = cls.__new__(cls)
+        c.code = code
+        c.mark = mark
+        return c
+
+    @property
+    def color(self):
+        return _code_color[self.code]
+
+    @property
+    def number(self):
+        return _code_number[self.code]
+
+    @property
+    def markup(self):
+        return Card._markup
+
+    @markup.setter
+    def markup(self, markup):
+        # there is no per card markup, so this sets it for all cards.
+        Card._markup = markup
 
     def front(self):
-        if self.color == 'rainbow':
-            return self.markup.color('%s%d' % ('RNBW', self.number), self.color)
-        else:
-            return self.markup.color('%s%d' % (self.color[0].upper(), self.number), self.color)
+        return self.markup.color(_code_front[self.code], _code_color[self.code])
 
     def back(self):
         return '%s' % self.mark
@@ -71,26 +179,104 @@ class Player(object):
         an opaque hand. If anyone else wants to see it, they see it all.
 
         Players can modify the order of cards in their own hands as well.
+
+        knowledge maps the mark of each card in the hand to its possibility
+        mask: what the hints given so far say the card could be.
+
+        version is bumped every time the hand changes and is used to cache
+        the rendered hand. Change the hand through the Player methods (or
+        assign a new hand), not by assigning into the list.
+
+        The hand is indexed as it changes: _slots maps each mark to the
+        card's slot and used is a bitmask of the marks in the hand, bit i
+        for the i-th letter. So finding a card or a free mark does not
+        search the hand.
     '''
+    __slots__ = ('name', '_hand', 'mark_index', 'version', '_rendered', 'knowledge',
+                 '_slots', 'used')
+
     def __init__(self, name):
         self.name = str(name)
+        self.version = 0
+        # rendered hands: (hidden, markup) -> (version, string)
+        self._rendered = dict()
+
         # The player's hand, a list of Cards
         self.hand = list()
 
+        # card mark -> possibility mask
+        self.knowledge = dict()
+
         # used to keep track of which mark to use when repeat backs option
         # is False
         self.mark_index = -1
 
+    @property
+    def hand(self):
+        return self._hand
+
+    @hand.setter
+    def hand(self, hand):
+        self._hand = hand
+        self.version += 1
+        self._slots = dict((c.mark, i) for i, c in enumerate(hand))
+        self.used = 0
+        for c in hand:
+            self.used |= 1 << _mark_bit[c.mark]
+
     def sort_cards(self):
         '''
         re-sort the card into "orginal" positions.
         '''
-        self.hand = sorted(self.hand, key=lambda x: x.mark)
+        self._sort()
         return gr(private={self.name: 'Your cards have been sorted.'})
 
+    def _sort(self):
+        self._hand.sort(key=lambda x: x.mark)
+        self._reslot(0)
+        self.version += 1
+
+    def _swap(self, i, j):
+        hand = self._hand
+        hand[i], hand[j] = hand[j], hand[i]
+        self._slots[hand[i].mark] = i
+        self._slots[hand[j].mark] = j
+        self.version += 1
+
+    def _move(self, j, i):
+        '''move the card in slot j to slot i.'''
+        self._hand.insert(i, self._hand.pop(j))
+        self._reslot(min(i, j))
+        self.version += 1
+
+    def _reslot(self, start):
+        '''Update the slots of the cards from slot start on.'''
+        for k in xrange(start, len(self._hand)):
+            self._slots[self._hand[k].mark] = k
+
+    def remove_card(self, i):
+        '''Remove and return the card in slot i.'''
+        self.version += 1
+        c = self._hand.pop(i)
+        self.knowledge.pop(c.mark, None)
+        del self._slots[c.mark]
+        self.used ^= 1 << _mark_bit[c.mark]
+        self._reslot(i)
+        return c
+
+    def hinted(self, mask):
+        '''Update knowledge for a hint about the cards in mask (see
+        variants.Rules.hint_masks). Cards the hint touches must be one of them, the others
+        must not.'''
+        for c in self._hand:
+            if mask >> c.code & 1:
+                self.knowledge[c.mark] &= mask
+            else:
+                self.knowledge[c.mark] &= ~mask
+
     def card_index(self, X):
-        # ugly, sorry. Works well though.
-        return next((i for i, c in enumerate(self.hand) if c.mark == X.upper()), None)
+        '''Return the slot of the card with mark X, None if there is none.'''
+        return self._slots.get(X.upper())
 
     def swap_cards(self, A, B):
         '''swap a card within a hand. output is for the group. A and B
@@ -101,7 +287,7 @@ class Player(object):
             message = '!swap card argument must be one of %s' % ', '.join(sorted([c.mark for c in self.hand]))
             return gr(private={self.name: message})
 
-        self.hand[i], self.hand[j] = self.hand[j], self.hand[i]
+        self._swap(i, j)
         return gr(private={self.name:'Swapped cards %s and %s' % (A, B)})
 
     def move_card(self, A, i):
@@ -121,7 +307,7 @@ class Player(object):
             message = 'move card argument must be one of %s' % ', '.join(sorted([c.mark for c in self.hand]))
             return gr(private={self.name: message})
 
-        self.hand.insert(i-1, self.hand.pop(j))
+        self._move(j, i-1)
         return gr(private={self.name: 'Moved card %s to position %d.' % (A, i)})
 
     def get_hand(self, hidden=False):
@@ -129,35 +315,67 @@ class Player(object):
         if not self.hand:
             return 'No hand dealt yet.'
 
+        # markup is the same for all cards.
+        key = (hidden, self.hand[0].markup)
+        cached = self._rendered.get(key)
+        if cached and cached[0] == self.version:
+            return cached[1]
+
         if not hidden:
-            return '%s: %s' % (self.name, ' '.join([str(c) for c in self.hand]))
+            s = '%s: %s' % (self.name, ' '.join([str(c) for c in self.hand]))
         else:
-            return '%s: %s' % (self.name, ''.join([c.back() for c in self.hand]))
+            s = '%s: %s' % (self.name, ''.join([c.back() for c in self.hand]))
 
-    def add_card(self, card, reuse=True):
+        self._rendered[key] = (self.version, s)
+        return s
+
+    def add_card(self, card, reuse=True, possible=None):
         '''Add a card to a player's hand. This method marks the back of the card
         appropriately and is the only way you should add cards to a player's hand.
-        If reuse == True, then marks will be reused. Otherwise new ones will be used.'''
-        if reuse:
-            # use sets to find the missing mark
-            missing = set(string.uppercase[:len(self.hand)+1]) - set([c.mark for c in self.hand])
+        If reuse == True, then marks will be reused. Otherwise new ones will be used.
+        possible is the mask of cards the new card could be, all cards if None.
 
-            if len(missing) == 0:
+        The card itself is not changed, a marked copy of it goes in the hand.
+        Cards are shared between forked games, so they must not change.'''
+        if reuse:
+            # the first free mark of the first len(hand)+1.
+            free = ~self.used & ((1 << len(self.hand) + 1) - 1)
+            if not free:
                 log.info('Error: adding card to player\'s hand')
                 return
 
-            # simply append the card after marking it.
-            card.mark = list(missing)[0]
+            mark = string.uppercase[(free & -free).bit_length() - 1]
         else:
-            cur_marks = [c.mark for c in self.hand]
-            for i in xrange(len(string.uppercase)):
-                self.mark_index = (self.mark_index + 1) % len(string.uppercase)
-                if not string.uppercase[self.mark_index] in cur_marks:
-                    break
-
-            card.mark = string.uppercase[self.mark_index]
+            # the next free mark after the last one given out, A after Z.
+            n = len(string.uppercase)
+            free = ~self.used & ((1 << n) - 1)
+            if not free:
+                log.info('Error: adding card to player\'s hand')
+                return
 
-        self.hand.append(card)
+            after = free >> (self.mark_index + 1) << (self.mark_index + 1)
+            free = after if after else free
+            self.mark_index = (free & -free).bit_length() - 1
+            mark = string.uppercase[self.mark_index]
+
+        self._slots[mark] = len(self._hand)
+        self._hand.append(Card.from_code(card.code, mark))
+        self.used |= 1 << _mark_bit[mark]
+        self.knowledge[mark] = (1 << len(COLORS) * RANKS) - 1 if possible is None else possible
+        self.version += 1
+
+    def fork(self):
+        '''Return a copy of the player that shares the (unchanging) cards.'''
+        p = Player.__new__(Player)
+        p.name = self.name
+        p._hand = list(self._hand)
+        p._slots = dict(self._slots)
+        p.used = self.used
+        p.mark_index = self.mark_index
+        p.version = self.version
+        p._rendered = dict(self._rendered)
+        p.knowledge = dict(self.knowledge)
+        return p
 
 
 class Game(object):
@@ -180,63 +398,194 @@ class Game(object):
         Example:
         TODO: doctest sample here.
     '''
-    # "static" class variables.
-    card_distribution = [1, 1, 1, 2, 2, 3, 3, 4, 4, 5]
-
-    def __init__(self):
+    __slots__ = ('colors', '_players', '_watchers', 'turn_order', 'max_players',
+                 'hint_log', '_hint_index', 'turn_number', 'options', 'notes_up', 'notes_down', 'notes',
+                 'max_notes', 'storms_up', 'storms_down', 'storms',
+                 'max_storms', 'markup', 'deck', '_playing', '_game_over',
+                 'rules', 'table', 'discards', 'copies',
+                 'unseen', '_rendered', '_seen',
+                 'last_round', 'seed', '_rng', 'actions', 'played', 'max_score',
+                 '_deal_bank')
+
+    def __init__(self, seed=None, deal_bank=None):
         '''
-            Later may take variants as args so something.
+            seed seeds all the shuffling done by the game. If not given
+            a random one is chosen. Later may take variants as args so
+            something.
+
+            If deal_bank, a deals.DealBank of new_deal() deals, is given
+            the deal and the seed are taken from it when the game starts.
         '''
-        self.colors = ['red', 'white', 'blue', 'green', 'yellow'] 
-        self._players = defaultdict(str)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self._rng = random.Random(self.seed)
+        self._deal_bank = deal_bank
+
+        # Every action that changes the game state, in order. Together with
+        # the seed this is enough to replay the game. See replay().
+        self.actions = list()
+
+        # the variant played, see variants.py. Standard until the game
+        # starts.
+        self.rules = rules('standard')
+        self.colors = list(self.rules.colors)
+        # players in the order they joined.
+        self._players = OrderedDict()
         self._watchers = list()   # list of nicks
         # turn_order[0] is always current player's name
         self.turn_order = []
         self.max_players = 5
 
-        # hist history for playback.
-        self._hints = defaultdict(list)
+        # every hint given, in order, as (turn number, HintGiven event), and
+        # nick -> indexes into hint_log of the hints nick was given. Hints
+        # are only turned into text when someone asks for them.
+        self.hint_log = list()
+        self._hint_index = defaultdict(list)
+        # the number of the turn being played, counting from 1.
+        self.turn_number = 1
 
         self.options = {
             'repeat_backs': { 'value': False, 'help': 'Toggle between using '
                              'A-E and A-Z for card backs.' },
             'solvable_rainbow_5': {'value': True, 'help': 'If True, do not '
                                    'allow the rainbow 1, 2, 3, or 4 to be on '
-                                   'the bottom of the deck.'}
+                                   'the bottom of the deck.'},
+            'playable_first_hand': {'value': False, 'help': 'If True, the first '
+                                    'player is always dealt at least one 1.'},
+            'hand_changes': {'value': False, 'help': 'If True, after each turn '
+                             'only the cards drawn are shown, not all the hands. '
+                             '!hands shows all of them.'}
         }
 
+        # tokens are counts. notes is the number of notes face up (hints
+        # available), storms the number of storms flipped up. The up/down
+        # chars are only used for display.
         self.notes_up, self.notes_down = ('w', 'b')
-        self.notes = [self.notes_up for i in range(8)]
+        self.max_notes = self.rules.max_notes
+        self.notes = self.max_notes
         self.storms_up, self.storms_down = ('X', 'O')
-        self.storms = [self.storms_down for i in range(3)]
+        self.max_storms = self.rules.max_storms
+        self.storms = 0
         
         self.markup = irc_markup()
 
-        # The deck is Cards with color and count distributions shown, shuffled.
-        self.deck = [Card(c, n) for c in self.colors
-                     for n in self.card_distribution]
-        random.shuffle(self.deck)
+        # The deck is Cards with color and count distributions shown. It is
+        # shuffled and dealt when the game starts.
+        self.deck = [Card.from_code(c) for c in self.rules.codes]
 
         self._playing = False
         self._game_over = False
-        self._rainbow_game = False  # True if using rainbow (multicolor) cards.
 
-        self._game_type = 'standard'  # different if rainbow. set in start_game()
+        # table is the height of each color group, indexed by color index.
+        # played is the number of cards on the table, i.e. sum(table), and
+        # max_score the number of cards in a complete table.
+        self.table = [0] * len(COLORS)
+        self.played = 0
+        self.max_score = self.rules.max_score
+
+        # discards[code] is the number of copies of the card discarded (or
+        # misplayed) and copies[code] the number of copies in the game.
+        self.discards = [0] * (len(COLORS) * RANKS)
+        self.copies = list(self.rules.copies)
+
+        # unseen[nick][code] is the number of copies of the card nick can
+        # not see: the ones in nick's hand or in the deck. Kept up to date
+        # as cards move, see _count_unseen().
+        self.unseen = dict()
 
-        # table is a dict of lists of cards, indexed by color. 
-        self.table = defaultdict(list)
+        # rendered table and discard lines: name -> (markup, string). An
+        # entry is dropped when what it shows changes.
+        self._rendered = dict()
 
-        # discards is just a set of numbers (1-5) indexed by color.
-        self.discards = defaultdict(list)
+        # nick -> the hands nick was last shown, as player -> tuple of the
+        # cards in the hand. Only kept with the hand_changes option on.
+        self._seen = dict()
 
         # last_round set to 0 when deck is empty and incremented each turn
         # when last_round == num players, the game is over.
         self.last_round = None
 
 
+    def fork(self):
+        '''Return an independent copy of the game. Cards, markup and the
+        recorded actions are shared, only the small containers holding the
+        game state are copied. A fork can also be used as a snapshot to
+        restore() later.'''
+        g = Game.__new__(Game)
+        for name in Game.__slots__:
+            setattr(g, name, getattr(self, name))
+
+        g._players = OrderedDict((n, p.fork()) for n, p in self._players.iteritems())
+        g._watchers = list(self._watchers)
+        g.turn_order = list(self.turn_order)
+        g.hint_log = list(self.hint_log)
+        g._hint_index = defaultdict(list, ((n, list(h)) for n, h in self._hint_index.iteritems()))
+        g.options = dict((o, dict(v) if isinstance(v, dict) else v)
+                         for o, v in self.options.iteritems())
+        g.colors = list(self.colors)
+        g.deck = list(self.deck)
+        g.table = list(self.table)
+        g.discards = list(self.discards)
+        g.unseen = dict((n, list(u)) for n, u in self.unseen.iteritems())
+        g._rendered = dict(self._rendered)
+        g._seen = dict(self._seen)
+        g.actions = list(self.actions)
+        g._rng = random.Random(0)
+        g._rng.setstate(self._rng.getstate())
+        return g
+
+    def restore(self, snapshot):
+        '''Put the game back into the state of snapshot, a fork of the game.
+        The snapshot is not changed, so it can be restored again.'''
+        g = snapshot.fork()
+        for name in Game.__slots__:
+            setattr(self, name, getattr(g, name))
+
+    def legal_moves(self, nick):
+        '''Return the encoded moves (see encode_move()) nick can make. This
+        is empty if it is not nick's turn. Hints that would not touch any
+        card are left out and each hint is only listed once.'''
+        if not self._playing or self._game_over or self.turn_order[0] != nick:
+            return []
+
+        hand = self._players[nick].hand
+        moves = [MOVE_PLAY << 8 | i for i in xrange(len(hand))]
+        moves += [MOVE_DISCARD << 8 | i for i in xrange(len(hand))]
+        if self.notes:
+            hint_masks = self.rules.hint_masks
+            for target in xrange(1, len(self.turn_order)):
+                codes = set(c.code for c in self._players[self.turn_order[target]].hand)
+                touched = sum(1 << code for code in codes)
+                # a color hint may touch other suits than its own (see
+                # Suit.touched_by), so ask the hint masks.
+                for color, name in zip(self.rules.color_indexes, self.rules.colors):
+                    if hint_masks[name] & touched:
+                        moves.append(MOVE_HINT_COLOR << 8 | target << 5 | color)
+                for number in sorted(set(code % RANKS + 1 for code in codes)):
+                    moves.append(MOVE_HINT_NUMBER << 8 | target << 5 | number)
+
+        return moves
+
+    def apply(self, move):
+        '''Make an encoded move for the current player. The move is not
+        checked and no text is generated, so only give moves from
+        legal_moves(). Returns the events of the move.'''
+        kind, target, value = move >> 8, (move >> 5) & 7, move & 31
+        nick = self.turn_order[0]
+        if kind == MOVE_PLAY:
+            self.actions.append(('p', nick, self._players[nick].hand[value].mark))
+            return self._play(nick, value)
+        elif kind == MOVE_DISCARD:
+            self.actions.append(('d', nick, self._players[nick].hand[value].mark))
+            return self._discard(nick, value)
+
+        hint = COLORS[value] if kind == MOVE_HINT_COLOR else value
+        player = self.turn_order[target]
+        self.actions.append(('h', nick, player, hint))
+        return self._hint(nick, player, hint)
+
     def in_game(self, nick):
         '''Return True is nick is in the game, False otherwise.'''
-        return nick in self._players.keys()
+        return nick in self._players
 
     def player_turn(self):
         '''REturn the nick of the player whose turn it is.'''
@@ -246,8 +595,16 @@ class Game(object):
         if not self.in_game(old_nick):
             return False
 
+        self.actions.append(('r', old_nick, new_nick))
         self._players[new_nick] = self._players.pop(old_nick)
         self._players[new_nick].name = new_nick
+        self._players[new_nick].version += 1
+        if old_nick in self.unseen:
+            self.unseen[new_nick] = self.unseen.pop(old_nick)
+        if old_nick in self._hint_index:
+            self._hint_index[new_nick] = self._hint_index.pop(old_nick)
+        # everyone is shown the new player's hand in full next turn.
+        self._seen.clear()
         for i in xrange(len(self.turn_order)):
             if self.turn_order[i] == old_nick:
                 self.turn_order[i] = new_nick
@@ -261,7 +618,7 @@ class Game(object):
             return gr('The game has yet to start. No turns yet.')
         else:
             s = 'It is %s\'s turn to play.' % self.turn_order[0]
-            if not self.notes_up in self.notes:
+            if not self.notes:
                 s += ' (Note: no hints remaining.)'
 
             return gr(s)
@@ -280,13 +637,13 @@ class Game(object):
         return self._game_over
 
     def game_type(self):
-        return self._game_type
+        return self.rules.name
 
     def score(self):
-        if not self.storms_down in self.storms:
+        if self.storms >= self.max_storms:
             return 0
         else:
-            return sum([len(cs) for cs in self.table.values()])
+            return self.played
 
     def watchers(self):
         '''return a list of people watching the game.'''
@@ -298,9 +655,10 @@ class Game(object):
 
     def stop_game(self, nick):
         retVal = gr()
-        if not nick in self._players.keys():
+        if not nick in self._players:
             retVal.public.append('You must be in the game to stop it.')
         else:
+            self.actions.append(('x', nick))
             retVal.merge(self._end_game())
 
         return retVal
@@ -318,33 +676,8 @@ class Game(object):
                         ', '.join(sorted([c.mark for c in self._players[nick].hand])))
             return retVal
             
-        c = self._players[nick].hand.pop(i)
-        if len(self.deck):
-            self._players[nick].add_card(self.deck.pop(0),
-                                         self.options['repeat_backs']['value'])
-       
-        retVal.public.append('%s has discarded %s' % (nick, str(c)))
-        self.discards[c.color].append(c.number)
-        self.discards[c.color].sort()
-        self._flip(self.notes, self.notes_down, self.notes_up)
-        self.turn_order.append(self.turn_order.pop(0))
-
-        if 0 == len(self.deck):
-            self.last_round = self.last_round + 1 if self.last_round is not None else 0
-
-        retVal.merge(self.get_table())
-
-        if 0 == len(self.deck):
-            retVal.public.append('Turns remaining in game: %d' % (
-                len(self._players)-self.last_round))
-
-        if self._is_game_over():
-            retVal.merge(self._end_game())
-        else:
-            # tell the next player it is their turn.
-            retVal.private[self.turn_order[0]].append('It is your turn in Hanabi.')
-
-        return retVal
+        self.actions.append(('d', nick, self._players[nick].hand[i].mark))
+        return render(self, self._discard(nick, i))
 
     def game_option(self, opts):
         '''handle in game options.'''
@@ -362,24 +695,111 @@ class Game(object):
                 retVal.public.append('Unsupported option: %s' % opt)
             else:
                 # current options are all just True/False toggles.
+                self.actions.append(('t', opt))
                 self.options[opt]['value'] = not self.options[opt]['value']
                 retVal.public.append('%s is now set to %s' % (
                     opt, self.options[opt]['value']))
 
         return retVal
 
-    def hints(self, nick, show_all=False):
+    def hints(self, nick, show_all=False, first=None, last=None):
+        '''Show nick the hints given to nick (to anyone if show_all) in
+        the order they were given. If first or last is given, only the hints
+        given on turns first to last are shown.'''
         retVal = gr()
-        retVal.private[nick].append('You\'ve yet to get any hints.')
         if show_all:
-            all_hints = [hint for p in self._hints.values() for hint in p]
-            if all_hints:
-                retVal.private[nick] = all_hints
-
+            given = self.hint_log
         else:
-            if self._hints[nick]:
-                retVal.private[nick] = self._hints[nick]
+            given = [self.hint_log[i] for i in self._hint_index.get(nick, ())]
+
+        if first is not None or last is not None:
+            first = 1 if first is None else first
+            last = self.turn_number if last is None else last
+            given = [h for h in given if first <= h[0] <= last]
+
+        if not given:
+            retVal.private[nick].append('You\'ve yet to get any hints.' if first is None else
+                                        'No hints were given on those turns.')
+            return retVal
+
+        retVal.private[nick] = ['Turn %d: %s' % (turn, hint_string(event)) for turn, event in given]
+        return retVal
+
+    def card_knowledge(self, nick):
+        '''Return what the hints given to nick say about nick's cards, as a
+        list of (mark, possibility mask) in hand order. See possible_cards().'''
+        if not nick in self._players:
+            return []
+
+        p = self._players[nick]
+        return [(c.mark, p.knowledge[c.mark]) for c in p.hand]
+
+    def get_knowledge(self, nick, player=None):
+        '''Show nick what player (nick if None) knows about their cards from
+        the hints given.'''
+        retVal = gr()
+        player = nick if player is None else player
+        if not player in self._players:
+            retVal.private[nick].append('%s is not in the game.' % player)
+            return retVal
+
+        if not self._players[player].hand:
+            retVal.private[nick].append('No hand dealt yet.')
+            return retVal
+
+        cards = []
+        for mark, mask in self.card_knowledge(player):
+            colors = [c for c in self.colors if mask & _color_masks[c]]
+            numbers = [str(n) for n in xrange(1, RANKS+1) if mask & _number_masks[n]]
+            s = ' '.join(
+                ([] if len(colors) == len(self.colors) else ['/'.join(colors)]) +
+                ([] if len(numbers) == RANKS else [''.join(numbers)]))
+            cards.append('%s: %s' % (mark, s if s else '?'))
+
+        who = 'your' if player == nick else '%s\'s' % player
+        retVal.private[nick].append('The hints say %s cards are %s' % (who, ', '.join(cards)))
+        return retVal
+
+    def playable_mask(self):
+        '''Return the possibility mask (see possible_cards()) of the cards that
+        can be played now.'''
+        return sum(1 << (c * RANKS + self.table[c]) for c in self.rules.color_indexes
+                   if self.table[c] < RANKS)
+
+    def card_odds(self, nick, i):
+        '''Return ([(code, chance)], chance playable) for the card in slot i
+        of nick's hand, from the hints nick was given and the cards nick can
+        not see. The chances are highest first. Each card is looked at on
+        its own, as if the rest of the hand could be anything.'''
+        p = self._players[nick]
+        mask = p.knowledge[p.hand[i].mark]
+        unseen = self.unseen[nick]
+        counts = [(code, n) for code, n in enumerate(unseen) if n and mask >> code & 1]
+        total = float(sum(n for code, n in counts))
+        if not total:
+            return [], 0.0
+
+        playable = self.playable_mask()
+        odds = sorted(((code, n / total) for code, n in counts), key=lambda x: -x[1])
+        return odds, sum(n for code, n in counts if playable >> code & 1) / total
+
+    def get_odds(self, nick, X):
+        '''Show nick what card X in their hand could be.'''
+        retVal = gr()
+        if not self._in_game(nick, retVal):
+            return retVal
+
+        i = self._players[nick].card_index(X)
+        if i is None:
+            retVal.private[nick].append('Card must be one of %s' %
+                        ', '.join(sorted([c.mark for c in self._players[nick].hand])))
+            return retVal
 
+        odds, playable = self.card_odds(nick, i)
+        cards = ['%s %d%%' % (Card.from_code(code).front(), round(100 * p)) for code, p in odds]
+        retVal.private[nick].append('Card %s could be %s. The chance it can be played now is %d%%.'
+                                    % (self._players[nick].hand[i].mark, ', '.join(cards),
+                                       round(100 * playable)))
         return retVal
 
     def play_card(self, nick, X):
@@ -397,49 +817,8 @@ class Game(object):
                         ', '.join(sorted([c.mark for c in self._players[nick].hand])))
             return retVal
 
-        c = self._players[nick].hand.pop(i)
-        if self._is_valid_play(c):
-            self.table[c.color].append(c)
-            self.table[c.color].sort()
-            retVal.public.append('%s successfully added %s to the %s group.' %
-                       (nick, str(c), c.color))
-            if len(self.table[c.color]) == 5:
-                retVal.public.append('Bonus for finishing %s group: one note token '
-                           'recovered!' % c.color)
-                self._flip(self.notes, self.notes_down, self.notes_up)
-        else:
-            retVal.public.append('%s guessed wrong with %s! One storm token '
-                          'flipped up!' % (nick, str(c)))
-            self._flip(self.storms, self.storms_down, self.storms_up)
-            self.discards[c.color].append(c.number)
-            self.discards[c.color].sort()
-
-        if len(self.deck):
-            self._players[nick].add_card(self.deck.pop(0), self.options['repeat_backs']['value'])
-            retVal.public.append('%s drew a new card from the deck into his or her hand.' % nick)
-
-        self.turn_order.append(self.turn_order.pop(0))
-
-        if 0 == len(self.deck):
-            self.last_round = self.last_round + 1 if self.last_round is not None else 0
-
-        retVal.merge(self.get_table())
-
-        if 0 == len(self.deck):
-            retVal.public.append('Turns remaining in game: %d' % (
-                len(self._players)-self.last_round))
-
-        if self._is_game_over():
-            retVal.merge(self._end_game())
-        else:
-            # tell the next player it is their turn.
-            s = 'It is your turn in Hanabi.'
-            if not self.notes_up in self.notes:
-                s += ' (Note: no hints remaining.)'
-
-            retVal.private[self.turn_order[0]].append(s)
-
-        return retVal
+        self.actions.append(('p', nick, self._players[nick].hand[i].mark))
+        return render(self, self._play(nick, i))
 
     def hint_player(self, nick, player, hint):
         '''
@@ -474,7 +853,7 @@ class Game(object):
                             'insensitive.' % ', '.join(self.colors))
                 return retVal
 
-        if not player in self._players.keys():
+        if not player in self._players:
             retVal.private[nick].append('player %s is not in the game.' % player)
             return retVal
 
@@ -495,76 +874,44 @@ class Game(object):
                 return retVal
 
 
-        elif isinstance(hint, int) and not 0 < hint < 6:
+        elif isinstance(hint, int) and not hint in self.rules.hint_masks:
             retVal.public.append('Invalid hint given by %s, still their turn.' % nick)
-            retVal.private[nick].append('numbers must be between 1 and 5 inclusive.')
+            retVal.private[nick].append('numbers must be between 1 and %d inclusive.' % RANKS)
             return retVal
 
         # valid hint command, do the action.
-        if not self.notes_up in self.notes:
+        if not self.notes:
             retVal.public.append('Oh no! %s gave a hint when all notes were turned '
                        'over. ' % nick)
             retVal.public.append('So, ya know, just disregard anything they said.')
             return retVal
 
-        cards = self._get_cards(player, hint)
-
-        if not len(cards):
-            hint_str = ('%s has given %s a hint: you have no %s cards' % (
-                       (nick, player, str(hint))))
-        else:
-            plural = 's ' if len(cards) > 1 else ' '
-            is_are = 'are ' if len(cards) > 1 else 'is '
-            a = 'a ' if isinstance(hint, int) else ''
-            hint_str = ('%s has given %s a hint: your card%s%s %s%s%s' % (
-                       (nick, player, plural, ', '.join([c.mark for c in cards]), is_are, 
-                        a, str(hint))))
-
-        retVal.public.append('======== %s' % hint_str)
-        self._hints[player].append(hint_str)
-
-        self.turn_order.append(self.turn_order.pop(0))
-        self._flip(self.notes, self.notes_up, self.notes_down)
-
-        if 0 == len(self.deck):
-            self.last_round = self.last_round + 1 if self.last_round is not None else 0
-
-        retVal.merge(self.get_table())
-
-        if 0 == len(self.deck):
-            retVal.public.append('Turns remaining in game: %d' % (
-                len(self._players)-self.last_round))
-
-        if self._is_game_over():
-            retVal.merge(self._end_game())
-        else:
-            # tell the next player it is their turn.
-            s = 'It is your turn in Hanabi.'
-            if not self.notes_up in self.notes:
-                s += ' (Note: no hints remaining.)'
-
-            retVal.private[self.turn_order[0]].append(s)
-
-        return retVal
+        self.actions.append(('h', nick, player, hint))
+        return render(self, self._hint(nick, player, hint))
 
     def swap_cards(self, nick, A, B):
         '''In nick's hand, swap cards A and B.'''
         retVal = gr()
-        if not nick in self._players.keys():
+        if not nick in self._players:
             retVal.private[nick].append('You are not in the game.')
             return retVal
 
-        retVal.merge(self._players[nick].swap_cards(A, B))
+        p = self._players[nick]
+        if p.card_index(A) is not None and p.card_index(B) is not None:
+            self.actions.append(('s', nick, A.upper(), B.upper()))
+
+        retVal.merge(p.swap_cards(A, B))
         retVal.merge(self.get_hands(nick))
         return retVal
 
     def sort_cards(self, nick):
         '''In nick's hand, sort cards to "original" A-E order.'''
         retVal = gr()
-        if not nick in self._players.keys():
+        if not nick in self._players:
             retVal.private[nick].append('You are not in game %s.')
             return retVal
 
+        self.actions.append(('o', nick))
         retVal.merge(self._players[nick].sort_cards())
         retVal.merge(self.get_hands(nick))
         return retVal
@@ -572,11 +919,15 @@ class Game(object):
     def move_card(self, nick, A, i):
         '''In nick's hand, move card A to slot i.'''
         retVal = gr()
-        if not nick in self._players.keys():
+        if not nick in self._players:
             retVal.private[nick].append('You are not in game %s.')
             return retVal
 
-        retVal.merge(self._players[nick].move_card(A, i))
+        p = self._players[nick]
+        if p.card_index(A) is not None and str(i).isdigit() and 1 <= int(i) <= len(p.hand):
+            self.actions.append(('m', nick, A.upper(), int(i)))
+
+        retVal.merge(p.move_card(A, i))
         retVal.merge(self.get_hands(nick))
         return retVal
 
@@ -591,64 +942,116 @@ class Game(object):
         
         # Now let's all join hands...
         retVal.private[nick].append('Current hands: %s' % ', '.join(hands))
+        if self.options['hand_changes']['value']:
+            self._seen[nick] = self._hands_shown()
+
         return retVal
 
+    def _hands_shown(self):
+        return dict((p.name, tuple(p.hand)) for p in self._players.itervalues())
+
+    def _hand_changes(self, nick, hands):
+        '''Return the cards drawn since nick was last shown the hands, as
+        text, or None if nick has not been shown them all. A card in a hand
+        is the same Card until it leaves it, so what is new is what was
+        not there before. Cards played or discarded are in the turn's
+        messages already and new places in a hand are only in !hands.'''
+        seen = self._seen.get(nick)
+        if seen is None or any(p not in seen for p in hands):
+            return None
+
+        drawn = list()
+        for p in self.turn_order:
+            before = seen[p]
+            for c in hands[p]:
+                if not any(c is b for b in before):
+                    drawn.append('%s drew %s' % (p, c.back() if p == nick else str(c)))
+
+        return drawn
+
     def get_discard_pile(self, nick):
         retVal = gr()
-        if not len(self.discards.keys()):
+        if not any(self.discards):
             retVal.private[nick].append('There are no cards in the discard pile.')
             return retVal
 
         retVal.private[nick].append(self._get_discards_string())
         return retVal
 
+    def copies_left(self, color, number):
+        '''Return the number of copies of a card that are neither discarded
+        nor on the table, i.e. are in the deck or in someone's hand.'''
+        code = card_code(color, number)
+        played = 1 if self.table[code // RANKS] >= number else 0
+        return self.copies[code] - self.discards[code] - played
+
+    def _get_groups_string(self, counts):
+        '''Render counts, indexed by card code, like: B45, R1123, W5.'''
+        groups = list()
+        for i in _color_display_order:
+            nums = ''.join(str(n) * counts[i * RANKS + n - 1] for n in xrange(1, RANKS+1))
+            if nums:
+                color = COLORS[i]
+                groups.append(self.markup.color(ABBREVS[color] + nums, color))
+
+        return ', '.join(groups)
+
     def _get_discards_string(self):
-        # display like: R123, W234, B45
-        cards = list()
-        # this is not efficent at all.
-        for color in sorted(self.discards.keys()):   
-            numbers = self.discards[color]
-            if color == 'rainbow':
-                cards.append(self.markup.color(
-                    'RNBW' + ''.join(str(x) for x in numbers), color))
-            else:
-                cards.append(self.markup.color(
-                    color[0].upper() + ''.join(str(x) for x in numbers), color))
+        cached = self._rendered.get('discards')
+        if cached and cached[0] is self.markup:
+            return cached[1]
+
+        s = 'Discards: %s' % self._get_groups_string(self.discards)
+        self._rendered['discards'] = (self.markup, s)
+        return s
+
+    def _get_table_string(self):
+        cached = self._rendered.get('table')
+        if cached and cached[0] is self.markup:
+            return cached[1]
+
+        on_table = [0] * len(self.discards)
+        for i, height in enumerate(self.table):
+            for n in xrange(height):
+                on_table[i * RANKS + n] = 1
 
-        return 'Discards: %s' % ', '.join(cards)
+        table = self._get_groups_string(on_table)
+        s = self.markup.underline('Table: %s' % (table if table else 'empty'))
+        self._rendered['table'] = (self.markup, s)
+        return s
 
     def get_table(self):
         ret = gr()
-        table = list()
-        # sorting by color each time is horrible. 
-        for color in sorted(self.table.keys()):
-            cards = self.table[color]
-            nums = ''.join(sorted([str(c.number) for c in cards]))
-            if nums:
-                if color == 'rainbow':
-                    table.append(self.markup.color('RNBW' + nums, color))
-                else:
-                    table.append(self.markup.color(color.upper()[0] + nums, color))
-
-        if not table:
-            ret.public.append(self.markup.underline('Table: empty'))
-        else:
-            ret.public.append(self.markup.underline('Table: %s' % ', '.join(table)))
+        ret.public.append(self._get_table_string())
 
-        ret.public.append('Notes: %s, Storms: %s, %d cards remaining.' %
-                         (''.join(sorted(self.notes)), ''.join(sorted(self.storms)), len(self.deck)))
+        ret.public.append('Notes: %s, Storms: %s, %d cards remaining.' % (
+            self.notes_down * (self.max_notes - self.notes) + self.notes_up * self.notes,
+            self.storms_down * (self.max_storms - self.storms) + self.storms_up * self.storms,
+            len(self.deck)))
 
-        if len(self.discards.keys()):
+        if any(self.discards):
             ret.public.append(self._get_discards_string())
 
         if not self._is_game_over():
             ret.merge(self.turn())
 
-            for p in self._players:
-                ret.merge(self.get_hands(p))
+            if not self.options['hand_changes']['value']:
+                for p in self._players:
+                    ret.merge(self.get_hands(p))
+
+                for w in self._watchers:
+                    ret.merge(self.get_hands(w))
+            else:
+                hands = self._hands_shown()
+                for nick in self._players.keys() + self._watchers:
+                    drawn = self._hand_changes(nick, hands)
+                    if drawn is None:
+                        ret.merge(self.get_hands(nick))
+                        continue
 
-            for w in self._watchers:
-                ret.merge(self.get_hands(w))
+                    if drawn:
+                        ret.private[nick].append('Hand changes: %s' % ', '.join(drawn))
+                    self._seen[nick] = hands
 
         return ret
 
@@ -659,7 +1062,7 @@ class Game(object):
         retVal = gr()
         if nick in self._watchers:
             retVal.private[nick].append('You are already observing the game.')
-        elif nick in self._players.keys():
+        elif nick in self._players:
             retVal.private[nick].append('You are already in the game as a '
                                         'player. You cannot also watch the '
                                         'game!')
@@ -677,13 +1080,14 @@ class Game(object):
         if len(self._players) >= self.max_players:
             retVal.private[nick].append('Max players already in the game.')
         else:
-            if nick in self._players.keys():
+            if nick in self._players:
                 retVal.private[nick].append('You are already in the game.')
             elif nick in self._watchers:
                 retVal.private[nick].append('You cannot be both an observer and'
                                             ' a player. Please !leave as oserver'
                                             ' before joining the game.')
             else: 
+                self.actions.append(('j', nick))
                 self._players[nick] = Player(nick)
                 retVal.public.append('%s has joined the game.' % nick)
                 if len(self._players) > 1:
@@ -694,7 +1098,7 @@ class Game(object):
 
     def remove_player(self, nick):
         '''remove players and watchers from the game.'''
-        if not nick in self._players.keys() + self._watchers:
+        if not nick in self._players and not nick in self._watchers:
             return gr(private={nick: 'You are not in the game. You cannot be removed '
                                'from a game you are not in.'})
 
@@ -703,31 +1107,23 @@ class Game(object):
         retVal.public.append('Removing %s from the game as %s.' % (nick, role))
         retVal.private[nick].append('You\'ve been removed from the game.')
         if nick in self._players:
-            if self._players[nick].hand:
+            self.actions.append(('l', nick))
+            dealt = bool(self._players[nick].hand)
+            if dealt:
                 retVal.public.append('Putting %s\'s cards back in the deck and reshuffling.' % nick)
-                self.deck += self._players[nick].hand
-                random.shuffle(self.deck)
 
-            del self._players[nick]
+            was_turn = self._playing and nick == self.turn_order[0]
+            self._remove(nick)
 
             if len(self._players) < 2:
                 retVal.public.append('Stopping the game as there are fewer than two people left in '
                            'the game.')
-                self._playing = False
-                self._game_over = True
-
-            elif len(self._players) < 4:
+            elif len(self._players) < 4 and dealt:
                 retVal.public.append('Now that there are fewer than four players, everyone gets '
                            'another card. Adding card to everyone\'s hand.')
-                for p in self._players.values():
-                    if len(self.deck):
-                        p.add_card(self.deck.pop(0), self.options['repeat_backs']['value'])
 
-            if self._playing:
-                if nick == self.turn_order[0]:
-                    retVal.public.append('It is now %s\'s turn.' % self.turn_order[1])
-       
-                del self.turn_order[0]
+            if self._playing and was_turn:
+                retVal.public.append('It is now %s\'s turn.' % self.turn_order[0])
 
         if nick in self._watchers:
             self._watchers.remove(nick)
@@ -738,7 +1134,7 @@ class Game(object):
         '''Start an existing game. Will fail if called by someone not in the game
         or if there are not enough players.'''
         retVal = gr()
-        if not nick in self._players.keys():
+        if not nick in self._players:
             retVal.private[nick].append('You are not in the game.')
             return retVal
 
@@ -746,86 +1142,305 @@ class Game(object):
             retVal.private[nick].append('The game has already begun.')
             return retVal
 
-        if len(self._players) > 1:
-            self._playing = True
-            retVal.public.append('The Hanabi game has started!')
-            self.turn_order = random.sample(self._players.keys(), len(self._players))
-        else:
+        if len(self._players) < 2:
             retVal.public.append('There are not enough players in the game, not starting.')
             return retVal
-       
-        if opts:
-            for opt, val in opts.iteritems():
-                # only one valid option for now.
-                if opt.startswith('rainbow'):
-                    self._rainbow_game = True
-                    self.colors.append('rainbow')
-                    if opt.endswith('5'):
-                        self._game_type = 'rainbow 5'
-                        retVal.public.append('Adding 5 rainbow cards to the deck')
-                        self.deck += [Card('rainbow', i) for i in xrange(1,6)]
-                    else:
-                        self._game_type = 'rainbow 10'
-                        retVal.public.append('Adding 10 rainbow cards to the deck')
-                        self.deck += [Card('rainbow', i) for i in self.card_distribution]
-
-                    random.shuffle(self.deck)
-                
-                    if self.options['solvable_rainbow_5'] and self._game_type == 'rainbow 5':
-                        retVal.public.append('Warning: the solvable rainbow 5 option is set. '
-                                             'This means that the deck is stacked a bit: hanabot'
-                                             ' ensures that there is no rainbow 1, 2, 3, or 4 '
-                                             'card on the bottom of the deck. If you\'d like '
-                                             ' a "natural" shuffle, do "!option '
-                                             'solvable_rainbow_5" and !delete, then restart the '
-                                             'game.')
-                        last_card = self.deck[len(self.deck)-1]
-                        while last_card.color == 'rainbow' and last_card.number != 5:
-                            log.debug('reshuffling as last card is %s' %
-                                      str(self.deck[len(self.deck)-1]))
-                            log.debug('...and solvable_rainbow_5 is toggled to True')
-                            random.shuffle(self.deck)
-                            last_card = self.deck[len(self.deck)-1]
-
-                else:
-                    retVal.public.append('Invalid option to start command: %s' % opt)
-                    retVal.public.append('Game not started.')
-                    return retVal
-
-        card_count = 5 if len(self._players) < 4 else 4
-        for player in self._players.values():
-            for c in self.deck[:card_count]:
-                player.add_card(c, self.options['repeat_backs']['value'])
 
-            self.deck = self.deck[card_count:]
+        # the options pick the variant.
+        opts = sorted(opts.keys()) if opts else []
+        for opt in opts:
+            if not opt in OPTIONS:
+                retVal.public.append('Invalid option to start command: %s' % opt)
+                retVal.public.append('Game not started.')
+                return retVal
+
+        self.actions.append(('S', nick, tuple(opts)))
+        self._start(opts)
+
+        retVal.public.append('The Hanabi game has started!')
+        retVal.public += self.rules.announce
+        for opt, (constraint, warning) in sorted(self.rules.constraint_options.iteritems()):
+            if self.options[opt]['value']:
+                retVal.public.append(warning)
 
         retVal.merge(self.get_table())
         return retVal
 
+    @classmethod
+    def replay(cls, seed, actions, upto=None):
+        '''Return a new Game in the state reached by doing the first upto
+        actions (all of them if upto is None) of a game with the given seed.
+        No output is generated while replaying.'''
+        game = cls(seed)
+        for action in actions[:upto]:
+            game._do(action)
+
+        return game
+
+    def save(self):
+        '''Return the game as a compact string: the seed, the nicks and the
+        actions. Game.load() turns it back into a game.'''
+        nicks = list()
+        index = dict()
+        for action in self.actions:
+            if action[0] == 't':
+                continue
+            for nick in action[1:3] if action[0] in 'rh' else action[1:2]:
+                if nick not in index:
+                    index[nick] = len(nicks)
+                    nicks.append(nick)
+
+        records = list()
+        for action in self.actions:
+            kind = action[0]
+            if kind == 't':
+                fields = [action[1]]
+            elif kind in 'rh':
+                fields = [index[action[1]], index[action[2]]] + list(action[3:])
+            elif kind == 'S':
+                fields = [index[action[1]]] + list(action[2])
+            else:
+                fields = [index[action[1]]] + list(action[2:])
+
+            records.append('.'.join([kind] + [str(f) for f in fields]))
+
+        return '%d %s %s' % (self.seed, ','.join(nicks), ' '.join(records))
+
+    @classmethod
+    def load(cls, record, upto=None):
+        '''Return the game saved by save(), replayed to the first upto
+        actions.'''
+        fields = record.split(' ')
+        seed = int(fields[0])
+        nicks = fields[1].split(',') if len(fields) > 1 else []
+        actions = list()
+        for r in fields[2:]:
+            f = r.split('.')
+            kind = f[0]
+            if kind == 't':
+                actions.append((kind, f[1]))
+            elif kind == 'r':
+                actions.append((kind, nicks[int(f[1])], nicks[int(f[2])]))
+            elif kind == 'h':
+                hint = int(f[3]) if f[3].isdigit() else f[3]
+                actions.append((kind, nicks[int(f[1])], nicks[int(f[2])], hint))
+            elif kind == 'S':
+                actions.append((kind, nicks[int(f[1])], tuple(f[2:])))
+            elif kind == 'm':
+                actions.append((kind, nicks[int(f[1])], f[2], int(f[3])))
+            else:
+                actions.append(tuple([kind, nicks[int(f[1])]] + f[2:]))
+
+        return cls.replay(seed, actions, upto)
+
     #
     # "private" methods below
     #
+    def _do(self, action):
+        '''Apply a single recorded action without validating it or
+        generating any output.'''
+        self.actions.append(action)
+        kind, nick = action[0], action[1]
+        if kind == 'p':
+            self._play(nick, self._players[nick].card_index(action[2]))
+        elif kind == 'd':
+            self._discard(nick, self._players[nick].card_index(action[2]))
+        elif kind == 'h':
+            self._hint(nick, action[2], action[3])
+        elif kind == 'm':
+            p = self._players[nick]
+            p._move(p.card_index(action[2]), action[3]-1)
+        elif kind == 's':
+            p = self._players[nick]
+            p._swap(p.card_index(action[2]), p.card_index(action[3]))
+        elif kind == 'o':
+            self._players[nick]._sort()
+        elif kind == 'j':
+            self._players[nick] = Player(nick)
+        elif kind == 'l':
+            self._remove(nick)
+        elif kind == 'S':
+            self._start(action[2])
+        elif kind == 'r':
+            self.actions.pop()
+            self.replace_player(nick, action[2])
+        elif kind == 't':
+            self.options[nick]['value'] = not self.options[nick]['value']
+        elif kind == 'x':
+            self._game_over = True
+            self._playing = False
+        else:
+            raise ValueError('Unknown action %s' % str(action))
+
+    def _start(self, opts):
+        '''Start the game: deal a deck for the options given and decide the
+        turn order.'''
+        self._playing = True
+        self.rules = rules_for_options(opts)
+        self.colors = list(self.rules.colors)
+        self.max_notes = self.notes = self.rules.max_notes
+        self.max_storms = self.rules.max_storms
+
+        constraints = []
+        for opt, (constraint, warning) in sorted(self.rules.constraint_options.iteritems()):
+            if self.options[opt]['value']:
+                constraints.append(constraint)
+        if self.options['playable_first_hand']['value']:
+            constraints.append('playable_first_hand')
+
+        spec = DealSpec(self.rules.name, len(self._players), tuple(constraints))
+        if self._deal_bank is not None:
+            # nothing has used the seed yet, so take the bank's.
+            self.seed, codes = self._deal_bank.take(spec)
+            self._rng = random.Random(self.seed)
+        else:
+            codes = new_deal(self.seed, spec)
+
+        self.turn_order = self._rng.sample(self._players.keys(), len(self._players))
+        self.max_score = self.rules.max_score
+        self.copies = list(self.rules.copies)
+
+        deck = [Card.from_code(c) for c in codes]
+        card_count = self.rules.hand_size(len(self._players))
+        for i, nick in enumerate(self.turn_order):
+            for c in deck[i * card_count:(i+1) * card_count]:
+                self._players[nick].add_card(c, self.options['repeat_backs']['value'],
+                                             self._possible())
+
+        del deck[:len(self.turn_order) * card_count]
+        self.deck = deck
+        self._count_unseen()
+
+    def _count_unseen(self):
+        '''Count the cards each player can not see from scratch. After this
+        unseen is kept up to date by _play(), _discard() and _draw().'''
+        unseen = [n - d for n, d in zip(self.copies, self.discards)]
+        for c, h in enumerate(self.table):
+            for n in xrange(h):
+                unseen[c * RANKS + n] -= 1
+
+        self.unseen = dict()
+        for nick in self._players:
+            self.unseen[nick] = list(unseen)
+            for other, p in self._players.iteritems():
+                if other != nick:
+                    for c in p.hand:
+                        self.unseen[nick][c.code] -= 1
+
+    def _play(self, nick, i):
+        '''nick plays the card in slot i. Returns the events.'''
+        c = self._players[nick].remove_card(i)
+        self.unseen[nick][c.code] -= 1
+        success = self._is_valid_play(c)
+        if success:
+            self.table[c.code // RANKS] = c.number
+            self._rendered.pop('table', None)
+            self.played += 1
+            if c.number == RANKS and self.notes < self.max_notes:
+                self.notes += 1
+        else:
+            if self.storms < self.max_storms:
+                self.storms += 1
+            self.discards[c.code] += 1
+            self._rendered.pop('discards', None)
+
+        events = [CardPlayed(nick, c, success, success and c.number == RANKS)]
+        self._draw(nick, events)
+        self._end_turn(events)
+        return events
+
+    def _discard(self, nick, i):
+        '''nick discards the card in slot i. Returns the events.'''
+        c = self._players[nick].remove_card(i)
+        self.unseen[nick][c.code] -= 1
+        events = [CardDiscarded(nick, c)]
+        self._draw(nick, events)
+        self.discards[c.code] += 1
+        self._rendered.pop('discards', None)
+        if self.notes < self.max_notes:
+            self.notes += 1
+
+        self._end_turn(events)
+        return events
+
+    def _hint(self, nick, player, hint):
+        '''nick gives player a hint. hint is a color name or a number.
+        Returns the events.'''
+        event = HintGiven(nick, player, hint,
+                          tuple(c.mark for c in self._get_cards(player, hint)))
+        self._hint_index[player].append(len(self.hint_log))
+        self.hint_log.append((self.turn_number, event))
+        self._players[player].hinted(self.rules.hint_masks[hint])
+        self.notes -= 1
+        events = [event]
+        self._end_turn(events)
+        return events
+
+    def _draw(self, nick, events):
+        if len(self.deck):
+            c = self.deck.pop(0)
+            self._players[nick].add_card(c, self.options['repeat_backs']['value'],
+                                         self._possible())
+            for other, unseen in self.unseen.iteritems():
+                if other != nick:
+                    unseen[c.code] -= 1
+            events.append(CardDrawn(nick, c))
+
+    def _end_turn(self, events):
+        '''Pass the turn to the next player and check for the end of the game.'''
+        self.turn_order.append(self.turn_order.pop(0))
+        self.turn_number += 1
+
+        if 0 == len(self.deck):
+            self.last_round = self.last_round + 1 if self.last_round is not None else 0
+
+        if self._is_game_over():
+            self._game_over = True
+            self._playing = False
+
+        events.append(TableState(self._game_over))
+
+    def _remove(self, nick):
+        '''Take nick out of the game, putting their cards back in the deck.'''
+        dealt = bool(self._players[nick].hand)
+        if dealt:
+            self.deck += self._players[nick].hand
+            self._rng.shuffle(self.deck)
+
+        del self._players[nick]
+        if nick in self.turn_order:
+            self.turn_order.remove(nick)
+
+        if len(self._players) < 2:
+            self._playing = False
+            self._game_over = True
+        elif len(self._players) < 4 and dealt:
+            for p in self._players.values():
+                if len(self.deck):
+                    p.add_card(self.deck.pop(0), self.options['repeat_backs']['value'],
+                               self._possible())
+
+        if dealt:
+            # rare, so just count again.
+            self._count_unseen()
+
+    def _possible(self):
+        '''Return the possibility mask of all cards in this game.'''
+        return self.rules.possible
+
     def _get_cards(self, player, hint):
         '''Figure out which cards the hint is referring to and return the list
         of indexes that match the hint. Hint can be an int (1-5) or a string (color).'''
-        return [c for c in self._players[player].hand if c.number == hint or c.color == hint]
-
-    def _flip(self, tokens, A, B):
-        '''flip the first non A char token to the B token char.'''
-        for i in xrange(len(tokens)):
-            if tokens[i] == A:
-                tokens[i] = B
-                return
+        mask = self.rules.hint_masks[hint]
+        return [c for c in self._players[player].hand if mask >> c.code & 1]
 
     def _is_game_over(self):
         '''Return True if an end game condition is true.'''
         if self.last_round is not None and self.last_round == len(self._players):
             return True
-        elif self._rainbow_game and 30 == sum([len(cs) for cs in self.table.values()]):
-            return True
-        elif not self._rainbow_game and 25 == sum([len(cs) for cs in self.table.values()]):
+        elif self.played == self.max_score:
             return True
-        elif not self.storms_down in self.storms:
+        elif self.storms >= self.max_storms:
             return True
         else:
             return False
@@ -847,17 +1462,15 @@ class Game(object):
             pub.append('Good! The audience is pleased!')
         elif 21 <= score <= 24:
             pub.append('Very good! The audience is enthusiastic!')
+        elif score == self.max_score:
+            pub.append(self.rules.perfect)
         elif score == 25:
-            if not self._rainbow_game:
-                pub.append('Congratulations! It\'s a perfect game! 25 points!')
-            else:
-                pub.append('Awesome Job!')
-        elif 25 <= score <= 29:    # can happen with rainbow cards
+            pub.append('Awesome Job!')
+        elif 25 < score < self.max_score:    # can happen with rainbow cards
             pub.append('Unbelievable! Well done! The audience is amazed!')
-        elif score == 30:
-            pub.append('Well, aren\'t you all amazing? A perfect score! The audience\'s brains have melted under the onslaught of beauty!')
         else:
-            pub.append('Hmm. score should only be in range 0 to 25 (or 30 w/rainbow cards). Somthing is amiss. Might as well play again...')
+            pub.append('Hmm. score should only be in range 0 to %d. Somthing is amiss. '
+                       'Might as well play again...' % self.max_score)
 
         pub.append('Final hands are:')
         for player in self._players.values():
@@ -867,23 +1480,14 @@ class Game(object):
         return gr(pub)
 
     def _is_valid_play(self, c):
-        if not len(self.table[c.color]):
-            if c.number == 1:
-                return True
-            else:
-                return False
-        else:
-            # if card is one greater than last number in color group
-            if self.table[c.color][-1].number + 1 == c.number:
-                return True
-            else:
-                return False
+        # if card is one greater than the height of its color group
+        return self.table[c.code // RANKS] + 1 == c.number
 
     def _in_game(self, nick, response):
         if not self._playing or self._game_over:
             response.private[nick].append('The game is not active.')
             return False
-        elif not nick in self._players.keys():
+        elif not nick in self._players:
             response.private[nick].append('You are not in game.')
             return False
         elif not self._playing:
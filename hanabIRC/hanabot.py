@@ -19,18 +19,25 @@ import traceback
 from collections import defaultdict
 from itertools import chain, islice
 
-from hanabi import Game
+from hanabi import Game, DealSpec, new_deal
+from deals import DealBank
+from bot_stats import BotStats
+from transport import OutputQueue
+from game_events import TURN_NOTICE
+from endgame import in_final_round
+from ai_player import AIPool, AI_PREFIX, is_ai, move_command
 from game_history import game_history
 from text_markup import irc_markup
 from GameResponse import GameResponse
 from irc.bot import SingleServerIRCBot
-from irc.client import VERSION as irc_client_version
+from irc.client import VERSION as irc_client_version, Event, NickMask
 from hanabIRC import __version__
 
 log = logging.getLogger(__name__)
 
 class Hanabot(SingleServerIRCBot):
-    def __init__(self, server, channels, nick, nick_pass, port, topic, hist_path):
+    def __init__(self, server, channels, nick, nick_pass, port, topic, hist_path,
+                 stats_path=None, stats_period=300, ai_budget_ms=500, ai_processes=1):
         log.debug('new bot started at %s:%d@#%s as %s', server, port,
                   channels, nick)
         SingleServerIRCBot.__init__(
@@ -44,8 +51,13 @@ class Hanabot(SingleServerIRCBot):
         self.topic = topic
         # this should be in the config file so that different network
         # rate limiting polices can be specified. These defaults
-        # are tuned to freenode.
-        self.connection.set_rate_limit(2)
+        # are tuned to freenode. Output is queued and sent from the event
+        # loop, which checks the queue at least every 0.2 seconds (the
+        # process_forever() timeout), see transport.py.
+        # a burst of 4 lets a short reply out at once, and lines to the
+        # same target go out together, see transport.py.
+        self.output = OutputQueue(self.connection, rate=2, burst=4, separator=' | ')
+        self.ircobj.execute_every(0.2, self.output.flush)
 
         game_history.hist_file = hist_path
 
@@ -61,14 +73,27 @@ class Hanabot(SingleServerIRCBot):
             'Game Action': ['play', 'hint', 'discard'],
             'Information': ['help', 'rules', 'turn', 'turns', 'game', 'hints',
                             'games', 'hands', 'table', 'discardpile', 'version',
-                            'last']
+                            'last', 'knowledge', 'endgame', 'odds']
         }
         
         self.commands = list()
         for cmds in self.command_dict.values():
             self.commands += cmds
 
-        self.commands_admin = ['die']
+        # op only commands.
+        self.commands_admin = ['maxscore', 'stats']
+
+        # !maxscore, !endgame and the final round analysis after a game
+        # run in the AI pool's workers, the result is posted when it is
+        # ready. (kind, channel) -> (event, state) of the search asked for:
+        # one search of each kind per channel at a time.
+        self.maxscore_time_limit = 3.0
+        self.endgame_time_limit = 1.0
+        self.searches = dict()
+
+        # channel -> a copy of the game as its final round started, for the
+        # analysis after the game.
+        self.final_rounds = dict()
 
         # these commands can execute without an active game.
         # otherwise the command handlers can assume an active game.
@@ -78,6 +103,34 @@ class Hanabot(SingleServerIRCBot):
         # games is a dict indexed by channel name, value is the Game object.
         self.games = dict()
 
+        # nick -> channels of the games nick plays in, in the order joined,
+        # and channel -> the players indexed for its game. Kept up to date
+        # by _index_nicks() after every command, so private messages and
+        # nick changes do not look through every game.
+        self.nick_games = dict()
+        self.game_nicks = dict()
+
+        # AI seats choose their moves in worker processes. The pool is made
+        # before any thread is started so the workers fork a single
+        # threaded bot. Moves are picked up by polling from the IRC thread.
+        # channel -> (channel, AI nick, number of game actions) of the move
+        # asked for.
+        self.ai_pool = AIPool(ai_processes, ai_budget_ms)
+        self.ai_pending = dict()
+        self.ircobj.execute_every(0.2, self._poll_ai)
+        self.ircobj.execute_every(0.2, self._poll_searches)
+
+        # deals are made ahead of time, off the IRC thread.
+        self.deal_bank = DealBank(new_deal, specs=[DealSpec('standard', n, ())
+                                                   for n in xrange(2, 6)])
+        self.deal_bank.start()
+
+        # command timing and message counts, see !stats. Also written to
+        # stats_path every stats_period seconds if stats_path is given.
+        self.stats = BotStats()
+        if stats_path:
+            self.ircobj.execute_every(stats_period, self.stats.dump, (stats_path,))
+
     # lib IRC callbacks
     #############################################################
     def get_version(self):
@@ -90,15 +143,15 @@ class Hanabot(SingleServerIRCBot):
     def on_welcome(self, conn, event):
         if self.nick_pass:
             msg = 'IDENTIFY %s %s' % (self.nick_name, self.nick_pass)
-            self.connection.privmsg('NickServ', msg)
+            self.output.privmsg('NickServ', msg, urgent=True, join=False)
         
         for chan in self.home_channels:
             conn.join(chan)
 
     def on_kick(self, conn, event):
-        time.sleep(1)
-        conn.join(self.channel)
-        conn.notice(self.channel, 'Why I outta....')
+        # rejoin in a second, without stopping the bot meanwhile.
+        self.ircobj.execute_delayed(1, conn.join, (event.target,))
+        self.output.notice(event.target, 'Why I outta....')
 
     def on_join(self, conn, event):
         log.debug('got on_join: %s %s', conn, event)
@@ -112,24 +165,22 @@ class Hanabot(SingleServerIRCBot):
         # If this is a priv msg, we need to reset the event to look
         # like a channel message. 
         if str(event.target) == self.nick_name:
-            for chan, game in self.games.iteritems():
-                if game.in_game(event.source.nick):
-                    event.target = chan
-                    break
-
-            else:
-                # note: this else is on the for() not the if()
+            chan = self._private_game(event.source.nick)
+            if not chan:
                 msg = ('If you are not in a game (in a channel) I cannot map this private '
                       'message to a channel or a game, so I have no context to respond. Join '
                       'a game and try again.')
                 self._to_nick(event, msg)
                 return
 
+            event.target = chan
+
         self.on_pubmsg(conn, event)
 
     def on_pubmsg(self, conn, event):
         try:
             log.debug('got pubmsg. %s -> %s', event.source, event.arguments)
+            self.stats.message_in(event.target)
             # messaged commands
             a = event.arguments[0].split(':', 1)
             if len(a) > 1 and string.lower(a[0]) == string.lower(
@@ -148,12 +199,46 @@ class Hanabot(SingleServerIRCBot):
     def on_nick(self, conn, event):
         before = event.source.nick
         after = event.target
-        for chan, game in self.games.iteritems():
-            if game.in_game(before):
-                if game.replace_player(before, after):
-                    self.connection.notice(chan,
-                                           'Replaced %s with %s in game in %s' % (
-                                               before, after, chan))
+        for chan in list(self.nick_games.get(before, ())):
+            if chan in self.games and self.games[chan].replace_player(before, after):
+                self.output.notice(chan, 'Replaced %s with %s in game in %s' % (
+                                       before, after, chan))
+            self._index_nicks(chan)
+
+    def _private_game(self, nick):
+        '''Return the channel of the game a private message from nick is
+        for, None if nick is not playing. A nick playing in several games
+        is taken to mean the one where it is their turn, else the one they
+        joined first.'''
+        chans = self.nick_games.get(nick)
+        if not chans:
+            return None
+
+        for chan in chans:
+            game = self.games.get(chan)
+            if game and game.has_started() and not game.game_over() and game.player_turn() == nick:
+                return chan
+
+        return chans[0]
+
+    def _index_nicks(self, chan):
+        '''Bring nick_games up to date with the players in the game in chan,
+        after a command that may have changed them or ended the game.'''
+        game = self.games.get(chan)
+        players = game.players() if game else []
+        old = self.game_nicks.pop(chan, set())
+        for nick in old.difference(players):
+            chans = self.nick_games[nick]
+            chans.remove(chan)
+            if not chans:
+                del self.nick_games[nick]
+
+        for nick in players:
+            if not nick in old:
+                self.nick_games.setdefault(nick, []).append(chan)
+
+        if players:
+            self.game_nicks[chan] = set(players)
 
     def parse_commands(self, event, cmds):
         try:
@@ -172,14 +257,20 @@ class Hanabot(SingleServerIRCBot):
                 return ([], 'Giving a command would be more useful.')
 
             # op only commands - return after executing.
-            #if cmds[0] in self.commands_admin:
-            #    log.debug('running admin cmd %s', cmds[0])
-            #    for chname, chobj in self.channels.items():
-            #        if nick in chobj.opers():
-            #            if cmds[0] == 'die':
-            #                self.die('Seppuku Successful')
+            if cmds[0] in self.commands_admin:
+                log.debug('running admin cmd %s', cmds[0])
+                chan = cmds[1] if len(cmds) > 1 else event.target
+                if not chan in self.channels or not nick in self.channels[chan].opers():
+                    self._to_nick(event, 'Only channel operators can use !%s.' % cmds[0])
+                    return
 
-            #            return
+                self.stats.command_start(cmds[0])
+                try:
+                    getattr(self, 'handle_%s' % cmds[0])(cmds[1:], event)
+                finally:
+                    self.stats.command_end()
+
+                return
 
             # valid user command check
             if not cmds[0] in self.commands:
@@ -197,20 +288,16 @@ class Hanabot(SingleServerIRCBot):
                         return
             
                 # invoke it!
-                method(cmds[1:], event)
+                self.stats.command_start(cmds[0])
+                try:
+                    method(cmds[1:], event)
+                finally:
+                    self.stats.command_end()
 
                 # clear possibly ended game after action.
-                if event.target in self.games:
-                    if self.games[event.target].game_over():
-                        g = self.games[event.target]
-                        game_history.add_game(g.score(), g.players(),
-                                              g.game_type(), event.target)
-
-                        for p in g.players():
-                            self.connection.privmsg('ChanServ', 'devoice %s %s'
-                                                    % (event.target, p))
-
-                        del self.games[event.target] 
+                self._check_game_over(event)
+                self._index_nicks(event.target)
+                self._ai_turn(event.target)
 
         except Exception, e:
             exc_type, exc_value, exc_tb = sys.exc_info()
@@ -225,25 +312,138 @@ class Hanabot(SingleServerIRCBot):
                 log.critical('%s', err)
                 self._to_chan(event, err)
 
+    def _check_game_over(self, event):
+        '''Add the game in the channel to the history and remove it if it is
+        over.'''
+        chan = event.target
+        if chan in self.games:
+            g = self.games[chan]
+            if in_final_round(g) and not chan in self.final_rounds:
+                self.final_rounds[chan] = g.fork()
+
+            if g.game_over():
+                record = g.save()
+                log.info('Game in %s ended: %s', chan, record)
+                game_history.add_game(g.score(), g.players(),
+                                      g.game_type(), chan, record)
+
+                self._devoice(chan, g.players())
+                del self.games[chan]
+                if chan in self.final_rounds:
+                    self._final_round_report(event, self.final_rounds.pop(chan), g)
+
+    def _final_round_report(self, event, start, game):
+        '''After a game, show how its final round could have gone.'''
+        self._search('report', 'endgame', event.target, event, start,
+                     self.endgame_time_limit, game.score())
+
+    def _report_result(self, event, chan, score, result):
+        if not result or not result.exact or result.score <= score:
+            return
+
+        self._to_chan(event, 'With all cards known, the final round could have scored %d: %s.'
+                      % (result.score, ', '.join(result.line)))
+
+    def _search(self, kind, name, chan, event, game, time_limit, state=None):
+        '''Ask the pool for the search name (see ai_player.SEARCHES) on game.
+        When it is done _<kind>_result(event, chan, state, result) posts
+        it. Return False if a search of the kind is already running in
+        chan.'''
+        key = (kind, chan)
+        if key in self.searches:
+            return False
+
+        self.searches[key] = (event, state)
+        self.ai_pool.search(key, name, game, time_limit)
+        return True
+
+    def _poll_searches(self):
+        '''Post the results of the searches the pool has finished.'''
+        for key, result in self.ai_pool.search_results():
+            if not key in self.searches:
+                continue
+
+            event, state = self.searches.pop(key)
+            kind, chan = key
+            getattr(self, '_%s_result' % kind)(event, chan, state, result)
+
+    def _devoice(self, chan, nicks):
+        for p in nicks:
+            if not is_ai(p):
+                self.output.privmsg('ChanServ', 'devoice %s %s' % (chan, p), join=False)
+
+    def _ai_turn(self, chan):
+        '''If it is an AI seat's turn in chan, ask the pool for its move.'''
+        if not chan in self.games or chan in self.ai_pending:
+            return
+
+        game = self.games[chan]
+        if not game.has_started() or game.game_over() or not is_ai(game.player_turn()):
+            return
+
+        key = (chan, game.player_turn(), len(game.actions))
+        self.ai_pending[chan] = key
+        self.ai_pool.submit(key, game, game.player_turn())
+
+    def _poll_ai(self):
+        '''Make the AI moves the pool has chosen, if they are still wanted.'''
+        for key, move in self.ai_pool.results():
+            chan, nick, actions = key
+            if self.ai_pending.get(chan) != key:
+                continue
+
+            del self.ai_pending[chan]
+            game = self.games.get(chan)
+            # the game may have been deleted or changed by a human while
+            # the AI was thinking.
+            if (not game or game.game_over() or game.player_turn() != nick or
+                    len(game.actions) != actions or move is None):
+                self._ai_turn(chan)
+                continue
+
+            method, args = move_command(game, nick, move)
+            event = Event('pubmsg', NickMask(nick), chan)
+            self.stats.command_start('ai')
+            try:
+                self._display(getattr(game, method)(*args), event)
+            finally:
+                self.stats.command_end()
+
+            self._check_game_over(event)
+            self._index_nicks(chan)
+            self._ai_turn(chan)
+
     # some sugar for sending msgs
     def _display(self, response, event, notice=False):
         '''response is a GameResponse instance. event is an irclib event, which gives us nick and channel.'''
-        # this whole function should be in a thread. We rate limit
-        # by sleeping here, which puts all other games are on pause.
-        # which is bad. 
+        # lines are only queued here, see transport.py.
         if not response:
             log.error('Got False response, not displaying output.')
         else:
+            lines = len(response.public) + sum(len(l) for l in response.private.itervalues())
+            start = time.time()
+            # Turn notices and one line replies (which is what errors are)
+            # are urgent. The channel lines of a move go with its turn
+            # notice, so the next player sees the move before their turn.
+            turn = any(l.startswith(TURN_NOTICE) for n, msgs in response.private.iteritems()
+                       if not is_ai(n) for l in msgs)
             for line in response.public:
                 if notice:
-                    self.connection.notice(event.target, line)
+                    self.output.notice(event.target, line, urgent=turn)
                 else:
-                    self.connection.privmsg(event.target, line)
+                    self.output.privmsg(event.target, line, urgent=turn)
+
+            # to user is always a notice. AI seats read the game itself.
+            single = lines == 1
+            for nick, msgs in response.private.iteritems():
+                if is_ai(nick):
+                    continue
+
+                for line in msgs:
+                    self.output.notice(nick, line, urgent=single or line.startswith(TURN_NOTICE))
 
-            # to user is always a notice.
-            for nick, lines in response.private.iteritems():
-                for line in lines:
-                    self.connection.notice(nick, line)
+            self.stats.queued(self.output.pending())
+            self.stats.output(event.target, lines, time.time() - start)
                        
     # some sugar for sending msgs
     def _to_chan(self, event, msgs):
@@ -457,10 +657,70 @@ class Hanabot(SingleServerIRCBot):
     def handle_hints(self, args, event):
         log.debug('got hints event. args: %s', args)
         nick = event.source.nick
-        if len(args) == 1 and args[0] == 'all':
-            self._display(self.games[event.target].hints(nick, show_all=True), event)
+        show_all = 'all' in args
+        turns = [a for a in args if a != 'all']
+        first = last = None
+        if turns:
+            try:
+                if len(turns) > 1:
+                    raise ValueError()
+                first, sep, last = turns[0].partition('-')
+                first = int(first) if first else None
+                last = int(last) if last else (None if sep else first)
+            except ValueError:
+                self._to_nick(event, 'Wrong arguments to !hints.')
+                self.handle_help(['hints'], event)
+                return
+
+        self._display(self.games[event.target].hints(nick, show_all, first, last), event)
+
+    def handle_knowledge(self, args, event):
+        log.debug('got knowledge event. args: %s', args)
+        nick = event.source.nick
+        player = args[0] if args else None
+        self._display(self.games[event.target].get_knowledge(nick, player), event)
+
+    def handle_endgame(self, args, event):
+        '''Show someone who is not playing the best way to finish the game.'''
+        log.debug('got endgame event. args: %s', args)
+        if not self._check_args(args, 0, [], event, 'endgame'):
+            return
+
+        game = self.games[event.target]
+        if event.source.nick in game.players():
+            self._to_nick(event, 'Nice try. !endgame is only for people who are not playing.')
+            return
+
+        if not in_final_round(game):
+            self._to_nick(event, 'The game is not in its final round yet.')
+        elif not self._search('endgame', 'endgame', event.target, event, game,
+                              self.endgame_time_limit, (len(game.actions), game.played)):
+            self._to_nick(event, 'Already looking, the answer is on its way.')
+
+    def _endgame_result(self, event, chan, state, result):
+        actions, played = state
+        game = self.games.get(chan)
+        if not game or len(game.actions) != actions:
+            self._to_nick(event, 'The game moved on while I was looking. Ask again.')
+        elif not result:
+            self._to_nick(event, 'Sorry, the search failed.')
+        elif not result.exact:
+            self._to_nick(event, 'The game can still reach at least %d. (Gave up looking '
+                          'for better.)' % result.score)
+        elif result.score == played:
+            self._to_nick(event, 'No more cards can be played. The game will end at %d.'
+                          % result.score)
         else:
-            self._display(self.games[event.target].hints(nick), event)
+            self._to_nick(event, 'The best the game can end with is %d: %s.'
+                          % (result.score, ', '.join(result.line)))
+
+    def handle_odds(self, args, event):
+        log.debug('got odds event. args: %s', args)
+        if not self._check_args(args, 1, [str], event, 'odds'):
+            return
+
+        nick = event.source.nick
+        self._display(self.games[event.target].get_odds(nick, args[0]), event)
 
     def handle_hands(self, args, event):
         ''' Show hands of current game.  '''
@@ -494,7 +754,7 @@ class Hanabot(SingleServerIRCBot):
             return 
         
         log.info('Starting new game.')
-        self.games[event.target] = Game()
+        self.games[event.target] = Game(deal_bank=self.deal_bank)
         self._display(GameResponse('New game started by %s. Accepting joins.' % nick),
                       event, notice=True)
 
@@ -506,11 +766,15 @@ class Hanabot(SingleServerIRCBot):
         msg = 'New game of %s starting in channel %s.' % (name, event.target)
         for chan in self.home_channels: 
             log.debug('game notification sent to %s: %s', event.target, msg)
-            self.connection.notice(chan, msg)
+            self.output.notice(chan, msg)
 
     def handle_join(self, args, event):
         '''join a game, if one is active.'''
         log.debug('got join event')
+        if args == ['ai']:
+            self._join_ai(event)
+            return
+
         if not self._check_args(args, 0, [], event, 'join'):
             return 
 
@@ -532,20 +796,55 @@ class Hanabot(SingleServerIRCBot):
             return
 
         if not self.channels[chan].is_voiced(nick):
-            self.connection.privmsg('ChanServ', 'voice %s %s' % (chan, nick))
+            self.output.privmsg('ChanServ', 'voice %s %s' % (chan, nick), join=False)
 
         self._display(self.games[chan].add_player(nick), event)
 
+    def _join_ai(self, event):
+        '''Add a computer player to the game in the channel.'''
+        chan = event.target
+        if not chan in self.games:
+            self._to_chan(event, 'There is no game started in %s, create one '
+                                 'with !new' % chan)
+            return
+
+        game = self.games[chan]
+        n = 1
+        while '%s%d' % (AI_PREFIX, n) in game.players():
+            n += 1
+
+        nick = '%s%d' % (AI_PREFIX, n)
+        self._display(self._to_caller(game.add_player(nick), nick, event), event)
+
+    def _to_caller(self, response, ai_nick, event):
+        '''Give the replies to ai_nick in response, which _display() would
+        drop, to the nick that gave the command instead. For the errors of
+        a command about an AI seat.'''
+        if ai_nick in response.private:
+            response.private[event.source.nick] += response.private.pop(ai_nick)
+
+        return response
+
     # GTL TODO: make sure this is called when the players leaves the channel?
     def handle_leave(self, args, event):
         '''leave an active game.'''
         log.debug('got leave event. args: %s', args)
+        if len(args) == 1 and is_ai(args[0]):
+            # anyone may remove a computer player.
+            game = self.games[event.target]
+            if not game.in_game(args[0]):
+                self._to_nick(event, 'There is no %s in the game.' % args[0])
+                return
+
+            self._display(game.remove_player(args[0]), event)
+            return
+
         if not self._check_args(args, 0, [], event, 'leave'):
             return 
 
         nick = event.source.nick
         chan = event.target
-        self.connection.privmsg('ChanServ', 'devoice %s %s' % (chan, nick))
+        self.output.privmsg('ChanServ', 'devoice %s %s' % (chan, nick), join=False)
 
         # remove the player and display the result
         self._display(self.games[event.target].remove_player(nick), event)
@@ -607,10 +906,9 @@ class Hanabot(SingleServerIRCBot):
         if not self._check_args(args, 0, [], event, 'delete'):
             return 
 
-        for p in self.games[event.target].players():
-            self.connection.privmsg('ChanServ', 'devoice %s %s' % (event.target, p))
-
+        self._devoice(event.target, self.games[event.target].players())
         del self.games[event.target]
+        self.final_rounds.pop(event.target, None)
         self._to_chan(event, '%s deleted game.' % event.source.nick)
 
     def handle_discardpile(self, args, event):
@@ -621,6 +919,38 @@ class Hanabot(SingleServerIRCBot):
         nick = event.source.nick
         self._display(self.games[event.target].get_discard_pile(nick), event)
 
+    def handle_maxscore(self, args, event):
+        '''Op only: privately show the best score the game could still reach
+        if everyone could see every card.'''
+        log.debug('got maxscore event. args: %s', args)
+        chan = args[0] if args else event.target
+        if not chan in self.games or not self.games[chan].has_started():
+            self._to_nick(event, 'There is no game being played in %s.' % chan)
+            return
+
+        if not self._search('maxscore', 'maxscore', chan, event, self.games[chan],
+                            self.maxscore_time_limit):
+            self._to_nick(event, 'Already looking, the answer is on its way.')
+
+    def _maxscore_result(self, event, chan, state, result):
+        if not result:
+            self._to_nick(event, 'Sorry, the search failed.')
+            return
+
+        score, exact = result
+        if exact:
+            msg = 'The best possible score for the game in %s is %d.' % (chan, score)
+        else:
+            msg = ('The game in %s can reach at least %d. (Gave up looking for '
+                   'better after %.1f seconds.)' % (chan, score, self.maxscore_time_limit))
+
+        self._to_nick(event, msg)
+
+    def handle_stats(self, args, event):
+        '''Op only: privately show command timing and message counts.'''
+        log.debug('got stats event. args: %s', args)
+        self._to_nick(event, self.stats.report())
+
     def _check_args(self, args, num, types, event, cmd):
         '''Check the given arguments for correct types and number. Show error
         message and help to nick on error and return False. Else return True. 
@@ -648,10 +978,10 @@ class Hanabot(SingleServerIRCBot):
     _command_usage = {
         'new': '!new [channel] - create a new game. If channel is given, hanabot will join that channel. (Then use !new in that channel to create a new game there.)', 
         'delete': '!delete - delete a game. Deleted games are not added to game history.', 
-        'join': '!join - join a game. If not game in channel, use !new to create one.', 
+        'join': '!join [ai] - join a game. If not game in channel, use !new to create one. "!join ai" adds a computer player to the game.', 
         'start': '!start [rainbow_5 | rainbow_10] - start a game. The game must have at least two players. If rainbow_5 is given, 5 rainbow cards will be added to the deck. If rainbow_10 is given, 10 rainbow cards will be added.',
         'stop': 'Immediately score a game, then stop/kill it.',
-        'leave': '!leave - leave a game. If you are player, this is bad form. If you are watching the game (via !watch) you will no longer receive hand updates.', 
+        'leave': '!leave [ai.N] - leave a game. If a computer player ai.N is given, remove it from the game instead. If you are player, this is bad form. If you are watching the game (via !watch) you will no longer receive hand updates.', 
         'part': '!part - tell Hanabot to part the channel. Note: Hanabot will not leave its home channel.', 
         'move': '!move card - move a card in your hand and slide all other cards "right". "card" must be one of A, B, C, D, or E. "index" is where to put the card, counting from the left and must be an integer between 1 and max hand size.',
         'swap': '!swap card card - swap cards in your hand. Card arguments must be one of A, B, C, D, or E.',
@@ -665,15 +995,20 @@ class Hanabot(SingleServerIRCBot):
         'turns': '!turns - show turn order in current play ordering.',
         'game': '!game - show the game state for current channel.', 
         'games': '!games - show game states for all channels hanabot has joined.',
-        'hints': '!hints [all] - show the hints given in the current game. If "all" is given, show all hints otherwise show only hints given to you.',
+        'hints': '!hints [all] [turns] - show the hints given in the current game, in the order they were given. If "all" is given, show all hints otherwise show only hints given to you. turns limits the hints to a turn (e.g. 12) or a range of turns (e.g. 10-15, 10- or -15).',
         'last': '!last [n [filter]] - Show the results of the last N games. If n not given, then show results for the last 10 games. If [filter] is given, filter the list by the string given.',
         'option': '!option [opt1 opt2 ... ] - If no arguments given, list current game options. Otherwise set the options given.', 
+        'knowledge': '!knowledge [nick] - show what the hints given so far say about each of your cards (or about the cards of nick). Cards are listed by letter with the colors and numbers they can still be.',
+        'endgame': '!endgame - once the deck is empty, privately show the best score the game can still reach and how. Only for people not playing the game.',
+        'odds': '!odds card - privately show what a card in your hand could be, and the chance it can be played now, from your hints and the cards you can see. "card" must be one of A, B, C, D, or E.',
         'hands': '!hands - show hands of players. Your own hand will be shown with the "backs" facing you, identified individually by a letter. When a card is removed the letter is reused for the new card.',
         'table': '!game - show the state of the table', 
         'watch': '!watch - join the game as a spectator. This means you get notices of hands after a move.',
         'discardpile': '!discardpile - show the current discard pile.',
         'grue': 'You are likely to be eaten.',
         'version': 'Show the version of the bot.',
+        'stats': '!stats - (ops only) privately show command counts and timing, messages per channel, and output queue depth.',
+        'maxscore': '!maxscore [channel] - (ops only) privately show the best score the game could reach if all hands and the deck were known.',
     }
 
 if __name__ == "__main__":
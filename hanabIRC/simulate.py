@@ -0,0 +1,264 @@
+'''
+    simulate.py runs headless games of Hanabi for load testing the
+    engine and for evaluating player policies.
+
+    Games are driven through the normal hanabi.Game API, but no output
+    is displayed. Each game is seeded, so a run is reproducible, and
+    games are spread over a pool of worker processes.
+
+    usage: python -m hanabIRC.simulate [-h] [-n GAMES] [-p PLAYERS]
+                                       [-j PROCESSES] [-s SEED]
+                                       [--policy POLICY]
+                                       [--rainbow {5,10}]
+
+    A policy is a function policy(game, nick, rng) which returns the move
+    for player nick as one of:
+        ('play', mark)
+        ('discard', mark)
+        ('hint', player, color_or_number)
+
+    Policies are chosen by name (see POLICIES) or given as module:function.
+'''
+import argparse
+import logging
+import multiprocessing
+import random
+import sys
+import time
+from collections import defaultdict
+
+from hanabi import Game, Card, RANKS
+from text_markup import text_markup_base
+
+log = logging.getLogger(__name__)
+
+# A game that takes more moves than this is broken (or the policy is).
+max_moves = 1000
+
+# per move latency histogram: bucket i holds moves that took less than
+# 2**i microseconds.
+latency_buckets = 24
+
+def random_policy(game, nick, rng):
+    '''Play, discard or hint at random.'''
+    hand = game._players[nick].hand
+    choices = ['play', 'discard']
+    if game.notes:
+        choices.append('hint')
+
+    action = rng.choice(choices)
+    if action == 'hint':
+        player = rng.choice([p for p in game.turn_order if p != nick])
+        hint = rng.choice(game.colors + range(1, 6))
+        return ('hint', player, hint)
+
+    return (action, rng.choice(hand).mark)
+
+def cheat_policy(game, nick, rng):
+    '''Look at your own cards: play a playable card, else hint if there
+    are notes, else discard a card that is already on the table or the
+    highest card in hand.'''
+    hand = game._players[nick].hand
+    for c in hand:
+        if game._is_valid_play(c):
+            return ('play', c.mark)
+
+    if game.notes:
+        return ('hint', game.turn_order[1], hand[0].number)
+
+    dead = [c for c in hand if c.number <= game.table[c.code // RANKS]]
+    if dead:
+        return ('discard', dead[0].mark)
+
+    return ('discard', max(hand, key=lambda c: c.number).mark)
+
+POLICIES = {
+    'random': random_policy,
+    'cheat': cheat_policy,
+}
+
+def get_policy(name):
+    '''Return the policy given by name or by "module:function".'''
+    if name in POLICIES:
+        return POLICIES[name]
+
+    if ':' not in name:
+        raise ValueError('Unknown policy %s. Known policies are %s or use '
+                         'module:function.' % (name, ', '.join(sorted(POLICIES))))
+
+    module, func = name.split(':', 1)
+    return getattr(__import__(module, fromlist=[func]), func)
+
+def play_game(seed, num_players, policy, opts=None):
+    '''Play a single game with the given seed. Return a dict with the
+    score, the number of moves and a latency histogram of the moves.'''
+    rng = random.Random(seed)
+    game = Game(seed)
+    game.markup = text_markup_base()
+    nicks = ['p%d' % i for i in xrange(1, num_players+1)]
+    for nick in nicks:
+        game.add_player(nick)
+
+    game.start_game(nicks[0], opts)
+
+    latency = [0] * latency_buckets
+    moves = 0
+    move_time = 0.0
+    while not game.game_over() and moves < max_moves:
+        nick = game.player_turn()
+        move = policy(game, nick, rng)
+        start = time.time()
+        if move[0] == 'play':
+            game.play_card(nick, move[1])
+        elif move[0] == 'discard':
+            game.discard_card(nick, move[1])
+        else:
+            game.hint_player(nick, move[1], move[2])
+        t = time.time() - start
+
+        move_time += t
+        moves += 1
+        latency[min(int(t * 1e6).bit_length(), latency_buckets-1)] += 1
+
+    if moves >= max_moves:
+        log.error('Game with seed %d did not end after %d moves.', seed, moves)
+
+    return {'seed': seed, 'score': game.score(), 'moves': moves,
+            'move_time': move_time, 'latency': latency}
+
+def _init_worker():
+    # no markup at all, it is just overhead here. Card.markup is a property,
+    # set what it returns.
+    Card._markup = text_markup_base()
+
+def _run_chunk(args):
+    '''Worker entry point: play games for a range of seeds and return the
+    merged results.'''
+    seeds, num_players, policy_name, opts = args
+    policy = get_policy(policy_name)
+    results = Results()
+    for seed in seeds:
+        results.add(play_game(seed, num_players, policy, opts))
+
+    return results
+
+class Results(object):
+    '''Merged results of many games.'''
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.move_time = 0.0
+        self.scores = defaultdict(int)
+        self.latency = [0] * latency_buckets
+
+    def add(self, game):
+        self.games += 1
+        self.moves += game['moves']
+        self.move_time += game['move_time']
+        self.scores[game['score']] += 1
+        for i, n in enumerate(game['latency']):
+            self.latency[i] += n
+
+    def merge(self, other):
+        self.games += other.games
+        self.moves += other.moves
+        self.move_time += other.move_time
+        for score, n in other.scores.iteritems():
+            self.scores[score] += n
+        for i, n in enumerate(other.latency):
+            self.latency[i] += n
+
+    def mean_score(self):
+        if not self.games:
+            return 0.0
+
+        return sum(s * n for s, n in self.scores.iteritems()) / float(self.games)
+
+    def latency_percentile(self, p):
+        '''Return the upper bound, in microseconds, of the latency bucket
+        holding the p-th percentile move.'''
+        total = sum(self.latency)
+        seen = 0
+        for i, n in enumerate(self.latency):
+            seen += n
+            if total and seen >= total * p / 100.0:
+                return 2 ** i
+
+        return 0
+
+    def report(self, elapsed):
+        lines = []
+        lines.append('%d games, %d moves in %.2f seconds: %.1f games/sec, %.1f moves/sec' % (
+            self.games, self.moves, elapsed, self.games / elapsed, self.moves / elapsed))
+        lines.append('mean score: %.2f' % self.mean_score())
+        lines.append('per move latency: mean %.1fus, p50 <%dus, p90 <%dus, p99 <%dus' % (
+            1e6 * self.move_time / max(self.moves, 1), self.latency_percentile(50),
+            self.latency_percentile(90), self.latency_percentile(99)))
+        lines.append('score distribution:')
+        for score in sorted(self.scores):
+            n = self.scores[score]
+            lines.append('  %2d: %7d %5.1f%%' % (score, n, 100.0 * n / self.games))
+
+        return lines
+
+def simulate(games, num_players, policy_name, seed=0, processes=None,
+             opts=None, chunk_size=100):
+    '''Play games games over a pool of processes. Returns (Results, elapsed seconds).'''
+    chunks = [(range(s, min(s + chunk_size, seed + games)), num_players, policy_name, opts)
+              for s in xrange(seed, seed + games, chunk_size)]
+
+    start = time.time()
+    results = Results()
+    if processes == 1:
+        # this is the caller's process, put its markup back afterwards.
+        markup = Card._markup
+        _init_worker()
+        try:
+            for chunk in chunks:
+                results.merge(_run_chunk(chunk))
+        finally:
+            Card._markup = markup
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker)
+        try:
+            for r in pool.imap_unordered(_run_chunk, chunks):
+                results.merge(r)
+        finally:
+            pool.close()
+            pool.join()
+
+    return results, time.time() - start
+
+if __name__ == "__main__":
+    desc = 'Play headless games of Hanabi and report speed and scores.'
+    argparser = argparse.ArgumentParser(description=desc)
+    argparser.add_argument('-n', '--games', type=int, default=1000,
+                           help='The number of games to play.')
+    argparser.add_argument('-p', '--players', type=int, default=3,
+                           choices=range(2, 6), help='Players per game.')
+    argparser.add_argument('-j', '--processes', type=int, default=None,
+                           help='Worker processes. Defaults to the number of CPUs.')
+    argparser.add_argument('-s', '--seed', type=int, default=0,
+                           help='Seed of the first game. Game i uses seed+i.')
+    argparser.add_argument('--policy', default='cheat',
+                           help='Player policy: %s or module:function.' %
+                           ', '.join(sorted(POLICIES)))
+    argparser.add_argument('--rainbow', choices=['5', '10'],
+                           help='Play with 5 or 10 rainbow cards.')
+    argparser.add_argument('--chunk', type=int, default=100,
+                           help='Games handed to a worker at a time.')
+    args = argparser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    try:
+        get_policy(args.policy)
+    except (ValueError, ImportError, AttributeError) as e:
+        print >>sys.stderr, 'Bad policy: %s' % e
+        sys.exit(1)
+
+    opts = {'rainbow_%s' % args.rainbow: True} if args.rainbow else None
+    results, elapsed = simulate(args.games, args.players, args.policy,
+                                args.seed, args.processes, opts, args.chunk)
+    for line in results.report(elapsed):
+        print line
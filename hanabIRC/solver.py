@@ -0,0 +1,315 @@
+'''
+    solver.py finds the best score a game of Hanabi could reach if every
+    player could see every hand and the order of the deck.
+
+    This is the "could this deal have been 25?" question. The answer is
+    found by a depth first search over the remaining moves with a
+    transposition table keyed on a compact state tuple and pruned by an
+    upper bound on the score still reachable from each state.
+
+    With perfect information some moves never need to be looked at: a
+    misplay is never better than a discard, any hint is as good as any
+    other (a hint only passes the turn and spends a note), and if a player
+    holds a card that can never be played, discarding it is at least as
+    good as discarding any other card.
+
+    The search can be bounded by a node count and a time limit. When it
+    stops early, the score returned is the best one found so far and is
+    not known to be the maximum.
+
+    usage: python -m hanabIRC.solver [-h] [-n GAMES] [-p PLAYERS] [-s SEED]
+                                     [--rainbow {5,10}] [--nodes NODES]
+                                     [-j PROCESSES] [--record RECORD]
+                                     [--upto UPTO]
+'''
+import argparse
+import bisect
+import logging
+import multiprocessing
+import sys
+import time
+
+from hanabi import Game, RANKS
+
+log = logging.getLogger(__name__)
+
+# default bound on the number of states searched.
+default_max_nodes = 500000
+
+class _Abort(Exception):
+    pass
+
+class Solver(object):
+    '''Perfect information solver for a started game. The game itself is
+    not changed.'''
+    def __init__(self, game, max_nodes=default_max_nodes, time_limit=None):
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.n = len(game.turn_order)
+        self.num_colors = len(game.colors)
+        self.max_notes = game.max_notes
+        self.max_score = game.max_score
+        self.over = game.game_over()
+        self.score = game.score()
+
+        # players are numbered in turn order, 0 is the current player.
+        self.hands = [sorted(c.code for c in game._players[p].hand) for p in game.turn_order]
+        self.deck = [c.code for c in game.deck]
+        self.ptr = 0
+        self.table = list(game.table[:self.num_colors])
+        self.played = game.played
+        self.notes = game.notes
+        self.last_round = -1 if game.last_round is None else game.last_round
+
+        # copies of each card that are not yet discarded or played.
+        self.remaining = [0] * (self.num_colors * RANKS)
+        for code in self.deck + [c for h in self.hands for c in h]:
+            self.remaining[code] += 1
+
+        # cap[c] is the highest the c group can still get.
+        self.cap = [self._cap(c) for c in xrange(self.num_colors)]
+
+        self.tt = dict()
+        self.nodes = 0
+        self.found = self.played
+
+    def _cap(self, color):
+        r = self.table[color]
+        while r < RANKS and self.remaining[color * RANKS + r]:
+            r += 1
+
+        return r
+
+    def upper_bound(self):
+        '''An upper bound on the final score from the current state.'''
+        ub = self.played + sum(self.cap[c] - self.table[c] for c in xrange(self.num_colors))
+        if self.last_round >= 0:
+            turns = self.n - self.last_round
+        else:
+            turns = len(self.deck) - self.ptr + self.n
+
+        return min(ub, self.played + turns)
+
+    def solve(self):
+        '''Return (score, exact). If exact is False the search was cut short
+        and score is only the best score found.'''
+        if self.over:
+            return self.score, True
+
+        self.nodes = 0
+        self.deadline = time.time() + self.time_limit if self.time_limit else None
+        try:
+            score = self._search(0, -1)
+            return score, True
+        except _Abort:
+            return self.found, False
+
+    def best_line(self):
+        '''Return a line of moves that reaches the best score, as (player,
+        kind, code) tuples. player is numbered in turn order from the current
+        player, kind is 0 for a play, 1 for a discard and 2 for a hint (code
+        is None). Only call after solve() returned an exact score.'''
+        self.nodes = 0
+        self.deadline = None
+        line = []
+        turn = 0
+        while not self.over and self.played < self.max_score and self.last_round < self.n:
+            best = self._search(turn, -1)
+            for kind, code in self._moves(self.hands[turn]):
+                undo = self._make(turn, kind, code)
+                # the transposition table makes this cheap.
+                if self._search((turn + 1) % self.n, best - 1) >= best:
+                    break
+                self._unmake(turn, kind, code, undo)
+            else:
+                break
+
+            line.append((turn, kind, code, undo))
+            turn = (turn + 1) % self.n
+
+        for turn, kind, code, undo in reversed(line):
+            self._unmake(turn, kind, code, undo)
+
+        return [l[:3] for l in line]
+
+    def _moves(self, hand):
+        '''Moves worth trying from hand, best first.'''
+        moves = []
+        seen = set()
+        dead = None
+        others = []
+        for code in hand:
+            if code in seen:
+                continue
+            seen.add(code)
+            color, rank = code // RANKS, code % RANKS + 1
+            if self.table[color] + 1 == rank:
+                moves.append((0, code))
+            elif rank <= self.table[color] or rank > self.cap[color]:
+                dead = code
+            else:
+                others.append(code)
+
+        if dead is not None:
+            moves.append((1, dead))
+
+        if self.notes:
+            moves.append((2, None))
+
+        if dead is None:
+            # throw away spare copies first, then high cards.
+            others.sort(key=lambda c: (self.remaining[c] == 1, -(c % RANKS)))
+            moves += [(1, code) for code in others]
+
+        return moves
+
+    def _search(self, turn, alpha):
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise _Abort()
+        if self.deadline and not self.nodes & 1023 and time.time() > self.deadline:
+            raise _Abort()
+
+        if self.played == self.max_score or self.last_round == self.n:
+            if self.played > self.found:
+                self.found = self.played
+            return self.played
+
+        ub = self.upper_bound()
+        if ub <= alpha or ub == self.played:
+            return ub
+
+        key = (turn, self.ptr, self.notes, self.last_round, tuple(self.table),
+               tuple(tuple(h) for h in self.hands))
+        entry = self.tt.get(key)
+        if entry and (entry[1] or entry[0] <= alpha):
+            return entry[0]
+
+        best = -1
+        hand = self.hands[turn]
+        next_turn = (turn + 1) % self.n
+        for kind, code in self._moves(hand):
+            undo = self._make(turn, kind, code)
+            v = self._search(next_turn, max(alpha, best))
+            self._unmake(turn, kind, code, undo)
+            if v > best:
+                best = v
+                if best >= ub:
+                    break
+
+        if best < 0:
+            # nothing to do at all, the score stays as it is.
+            best = self.played
+
+        self.tt[key] = (best, best > alpha)
+        return best
+
+    def _make(self, turn, kind, code):
+        undo = (self.notes, self.last_round, self.ptr, list(self.cap) if kind == 1 else None)
+        hand = self.hands[turn]
+        if kind == 0:
+            hand.remove(code)
+            self.table[code // RANKS] += 1
+            self.played += 1
+            if code % RANKS == RANKS - 1 and self.notes < self.max_notes:
+                self.notes += 1
+        elif kind == 1:
+            hand.remove(code)
+            self.remaining[code] -= 1
+            if not self.remaining[code]:
+                self.cap[code // RANKS] = self._cap(code // RANKS)
+            if self.notes < self.max_notes:
+                self.notes += 1
+        else:
+            self.notes -= 1
+
+        if kind != 2 and self.ptr < len(self.deck):
+            bisect.insort(hand, self.deck[self.ptr])
+            self.ptr += 1
+
+        if self.ptr == len(self.deck):
+            self.last_round += 1
+
+        return undo
+
+    def _unmake(self, turn, kind, code, undo):
+        self.notes, self.last_round, ptr, cap = undo
+        hand = self.hands[turn]
+        if self.ptr != ptr:
+            hand.remove(self.deck[ptr])
+            self.ptr = ptr
+
+        if kind == 0:
+            self.table[code // RANKS] -= 1
+            self.played -= 1
+            bisect.insort(hand, code)
+        elif kind == 1:
+            self.remaining[code] += 1
+            self.cap = cap
+            bisect.insort(hand, code)
+
+def max_score(game, max_nodes=default_max_nodes, time_limit=None):
+    '''Return (score, exact): the best score game could reach with perfect
+    information. See Solver.solve().'''
+    return Solver(game, max_nodes, time_limit).solve()
+
+def new_game(seed, num_players, opts=None):
+    '''Return a just started game for seed.'''
+    game = Game(seed)
+    nicks = ['p%d' % i for i in xrange(1, num_players+1)]
+    for nick in nicks:
+        game.add_player(nick)
+
+    game.start_game(nicks[0], opts)
+    return game
+
+def _solve_seed(args):
+    seed, num_players, opts, max_nodes = args
+    return (seed,) + max_score(new_game(seed, num_players, opts), max_nodes)
+
+if __name__ == "__main__":
+    desc = 'Compute the best possible score of Hanabi deals.'
+    argparser = argparse.ArgumentParser(description=desc)
+    argparser.add_argument('-n', '--games', type=int, default=100,
+                           help='The number of deals to solve.')
+    argparser.add_argument('-p', '--players', type=int, default=3,
+                           choices=range(2, 6), help='Players per game.')
+    argparser.add_argument('-s', '--seed', type=int, default=0,
+                           help='Seed of the first deal. Deal i uses seed+i.')
+    argparser.add_argument('--rainbow', choices=['5', '10'],
+                           help='Play with 5 or 10 rainbow cards.')
+    argparser.add_argument('--nodes', type=int, default=default_max_nodes,
+                           help='Give up on a deal after this many states.')
+    argparser.add_argument('-j', '--processes', type=int, default=None,
+                           help='Worker processes. Defaults to the number of CPUs.')
+    argparser.add_argument('--record', help='Solve a game saved with Game.save() '
+                           'instead of new deals.')
+    argparser.add_argument('--upto', type=int, default=None,
+                           help='With --record, solve from after this many actions.')
+    args = argparser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.record:
+        game = Game.load(args.record, args.upto)
+        score, exact = max_score(game, args.nodes)
+        print '%d%s' % (score, '' if exact else ' (search cut short)')
+        sys.exit(0)
+
+    opts = {'rainbow_%s' % args.rainbow: True} if args.rainbow else None
+    jobs = [(s, args.players, opts, args.nodes)
+            for s in xrange(args.seed, args.seed + args.games)]
+
+    start = time.time()
+    pool = multiprocessing.Pool(args.processes)
+    results = sorted(pool.imap_unordered(_solve_seed, jobs))
+    pool.close()
+    pool.join()
+
+    best = 30 if args.rainbow else 25
+    for seed, score, exact in results:
+        print 'seed %d: %d%s' % (seed, score, '' if exact else ' (search cut short)')
+
+    print '%d deals in %.2f seconds. %d can reach %d, %d searches cut short.' % (
+        len(results), time.time() - start, sum(1 for r in results if r[1] == best),
+        best, sum(1 for r in results if not r[2]))
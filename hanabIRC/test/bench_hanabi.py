@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+'''
+    Micro-benchmarks for the hot paths of hanabi.Game.
+
+    Each path is timed alone, one call at a time, on mid-game positions
+    from a set of seeded games, for 2-5 players, with and without
+    watchers, for standard and rainbow games. Each call gets a fresh copy
+    of its position, made with Game.fork(), or on commits from before
+    fork() existed built again from the seed, and only the call itself is
+    timed. So the same script measures the engine before and after a
+    change.
+
+    Results are written as JSON so runs from different commits can be
+    compared:
+
+        python bench_hanabi.py -o before.json
+        ... change the engine ...
+        python bench_hanabi.py -o after.json --compare before.json
+
+    Watchers can only join a started game, so start_game is timed without
+    them. As with timeit, garbage collection is off while timing.
+'''
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import time
+from timeit import default_timer as timer
+
+from hanabi import Game
+
+GAME_TYPES = {
+    'standard': None,
+    'rainbow_5': {'rainbow_5': True},
+    'rainbow_10': {'rainbow_10': True},
+}
+
+# random moves played to reach a mid-game position.
+warmup_moves = 12
+
+def new_game(seed, num_players, opts, watchers=0, start=True):
+    # older engines take no seed and shuffle with the random module.
+    random.seed(seed)
+    try:
+        game = Game(seed)
+    except TypeError:
+        game = Game()
+
+    for i in xrange(num_players):
+        game.add_player('p%d' % i)
+
+    if start:
+        game.start_game('p0', opts)
+        for i in xrange(watchers):
+            game.add_watcher('w%d' % i)
+
+    return game
+
+def mid_game(seed, num_players, opts, watchers, moves=warmup_moves):
+    '''A game some moves in that is not over. The same arguments always
+    give the same game.'''
+    rng = random.Random(seed)
+    game = new_game(seed, num_players, opts, watchers)
+    for i in xrange(moves):
+        nick = game.player_turn()
+        mark = rng.choice(game._players[nick].hand).mark
+        if rng.random() < 0.5:
+            game.discard_card(nick, mark)
+        else:
+            game.play_card(nick, mark)
+
+        if game.game_over():
+            return mid_game(seed, num_players, opts, watchers, i)
+
+    return game
+
+def positions(seeds, num_players, opts, watchers):
+    '''Return a function per seed that returns a fresh copy of its mid-game
+    position.'''
+    if hasattr(Game, 'fork'):
+        return [mid_game(s, num_players, opts, watchers).fork for s in seeds]
+
+    return [lambda s=s: mid_game(s, num_players, opts, watchers) for s in seeds]
+
+def _fill_notes(g):
+    # older engines keep the notes as a list of token chars.
+    if isinstance(g.notes, list):
+        g.notes = [g.notes_up] * len(g.notes)
+    else:
+        g.notes = g.max_notes
+
+def _play(g):
+    nick = g.player_turn()
+    g.play_card(nick, g._players[nick].hand[0].mark)
+
+def _discard(g):
+    nick = g.player_turn()
+    g.discard_card(nick, g._players[nick].hand[0].mark)
+
+def _hint(g):
+    g.hint_player(g.player_turn(), g.turn_order[1], g._players[g.turn_order[1]].hand[0].color)
+
+def _hands(g):
+    g.get_hands(g.player_turn())
+
+# path -> function called on a copy of a mid-game position.
+PATHS = {
+    'play_card': _play,
+    'discard_card': _discard,
+    'hint_player': _hint,
+    'get_table': lambda g: g.get_table(),
+    'get_hands': _hands,
+    '_end_game': lambda g: g._end_game(),
+}
+
+# path -> function called, untimed, on the position first. A hint needs
+# a note to give or only the "no notes" error is timed.
+SETUP = {
+    'hint_player': _fill_notes,
+}
+
+def summarize(times):
+    times = sorted(times)
+    n = len(times)
+    return {
+        'n': n,
+        'min_us': 1e6 * times[0],
+        'median_us': 1e6 * times[n // 2],
+        'p90_us': 1e6 * times[int(n * 0.9)],
+        'mean_us': 1e6 * sum(times) / n,
+    }
+
+def bench_start(num_players, opts, repeat, seeds):
+    times = []
+    for i in xrange(repeat):
+        game = new_game(seeds[i % len(seeds)], num_players, opts, start=False)
+        t = timer()
+        game.start_game('p0', opts)
+        times.append(timer() - t)
+
+    return times
+
+def bench_path(func, positions, repeat, setup=None):
+    times = []
+    for i in xrange(repeat):
+        g = positions[i % len(positions)]()
+        if setup:
+            setup(g)
+
+        t = timer()
+        func(g)
+        times.append(timer() - t)
+
+    return times
+
+def run(repeat, seeds, paths=None):
+    '''Return {case name: summary}. Case names are path/players/type/watchers.'''
+    results = dict()
+    for game_type, opts in sorted(GAME_TYPES.iteritems()):
+        for num_players in xrange(2, 6):
+            if not paths or 'start_game' in paths:
+                name = 'start_game/%dp/%s/0w' % (num_players, game_type)
+                results[name] = summarize(bench_start(num_players, opts, repeat, seeds))
+
+            for watchers in (0, 3):
+                copies = positions(seeds, num_players, opts, watchers)
+                for path, func in sorted(PATHS.iteritems()):
+                    if paths and path not in paths:
+                        continue
+
+                    name = '%s/%dp/%s/%dw' % (path, num_players, game_type, watchers)
+                    results[name] = summarize(bench_path(func, copies, repeat, SETUP.get(path)))
+
+    return results
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new, threshold):
+    '''Return report lines comparing median times of two result sets.'''
+    lines = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        a = old['results'][name]['median_us']
+        b = new['results'][name]['median_us']
+        ratio = b / a if a else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  SLOWER'
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+
+        lines.append('%-40s %9.1fus %9.1fus %6.2fx%s' % (name, a, b, ratio, flag))
+
+    return lines
+
+if __name__ == '__main__':
+    desc = 'Time the hot paths of hanabi.Game and write the results as JSON.'
+    argparser = argparse.ArgumentParser(description=desc)
+    argparser.add_argument('-o', '--output', help='Write results to this file.')
+    argparser.add_argument('-n', '--repeat', type=int, default=500,
+                           help='Timed calls per case.')
+    argparser.add_argument('-s', '--seeds', type=int, default=20,
+                           help='Number of seeded games to take positions from.')
+    argparser.add_argument('--path', action='append', choices=['start_game'] + sorted(PATHS),
+                           help='Only time this path. May be given more than once.')
+    argparser.add_argument('--compare', help='Compare with results from this file.')
+    argparser.add_argument('--threshold', type=float, default=0.1,
+                           help='Relative change in median time reported by --compare.')
+    args = argparser.parse_args()
+
+    start = time.time()
+    gc.disable()
+    results = run(args.repeat, range(args.seeds), args.path)
+    gc.enable()
+    data = {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seeds': args.seeds,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fd:
+            old = json.load(fd)
+
+        print '%-40s %11s %11s' % ('case (median)', old['meta'].get('commit'), data['meta']['commit'])
+        for line in compare(old, data, args.threshold):
+            print line
+    else:
+        for name in sorted(results):
+            r = results[name]
+            print '%-40s median %8.1fus  p90 %8.1fus' % (name, r['median_us'], r['p90_us'])
+
+    print >>sys.stderr, '%d cases in %.1f seconds.' % (len(results), time.time() - start)
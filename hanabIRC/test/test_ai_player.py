@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import random
+import time
+import unittest2
+from ai_player import AIPool, choose_move, determinize, is_ai, move_command, \
+    rollout_move, unseen_cards, _decide, _search
+import ai_player
+from hanabi import Game, MOVE_DISCARD
+
+def new_game(seed):
+    game = Game(seed)
+    for p in ['ai.1', 'p2', 'p3']:
+        game.add_player(p)
+
+    game.start_game('p2')
+    return game
+
+class test_ai_player(unittest2.TestCase):
+
+    def test_is_ai(self):
+        self.assertTrue(is_ai('ai.1'))
+        self.assertFalse(is_ai('aimee'))
+
+    def test_choose_move(self):
+        game = new_game(0)
+        nick = game.player_turn()
+        start = time.time()
+        move = choose_move(game, nick, 100, random.Random(0))
+        self.assertLess(time.time() - start, 1.0)
+        self.assertIn(move, game.legal_moves(nick))
+
+        method, args = move_command(game, nick, move)
+        self.assertTrue(getattr(game, method)(*args))
+        self.assertNotEqual(nick, game.player_turn())
+
+    def test_determinize(self):
+        game = new_game(1)
+        nick = game.turn_order[0]
+        game.hint_player(nick, game.turn_order[1], game._players[game.turn_order[1]].hand[0].color)
+        other = game.turn_order[0]
+        unseen = unseen_cards(game, other)
+        self.assertEqual(len(game.deck) + len(game._players[other].hand), sum(unseen))
+
+        hinted = game._players[other].hand[0]
+        for i in xrange(20):
+            world = determinize(game, other, random.Random(i), unseen)
+            # the cards other can see do not change.
+            self.assertEqual([c.code for c in game._players[nick].hand],
+                             [c.code for c in world._players[nick].hand])
+            self.assertEqual(hinted.color, world._players[other].hand[0].color)
+            self.assertEqual(len(game.deck), len(world.deck))
+
+    def test_decide_errors(self):
+        # a worker always answers, or the game waits on the AI for good.
+        self.assertEqual(('k', None), _decide(('k', 'not a record', 'ai.1', 10, 0)))
+
+        game = new_game(3)
+        nick = game.player_turn()
+        def broken(*args):
+            raise RuntimeError('search bug')
+
+        search, ai_player.choose_move = ai_player.choose_move, broken
+        try:
+            key, move = _decide(('k', game.save(), nick, 10, 0))
+        finally:
+            ai_player.choose_move = search
+
+        self.assertEqual(MOVE_DISCARD, move >> 8)
+        self.assertIn(move, game.legal_moves(nick))
+
+    def test_search(self):
+        game = new_game(4)
+        key, (score, exact) = _search(('k', 'maxscore', game.save(), 1.0))
+        self.assertEqual('k', key)
+        self.assertGreater(score, 0)
+
+        while game.last_round is None:
+            game.apply(rollout_move(game, game.player_turn()))
+        key, result = _search(('k', 'endgame', game.fork().save(), 1.0))
+        self.assertTrue(result.exact)
+        self.assertGreaterEqual(result.score, game.played)
+
+        self.assertEqual(('k', None), _search(('k', 'maxscore', 'not a record', 1.0)))
+
+    def test_pool(self):
+        game = new_game(2)
+        nick = game.player_turn()
+        key, move = _decide(('k', game.save(), nick, 10, 0))
+        self.assertEqual('k', key)
+        self.assertIn(move, game.legal_moves(nick))
+
+        pool = AIPool(1, 10)
+        try:
+            pool.submit('k', game, nick)
+            for i in xrange(500):
+                results = pool.results()
+                if results:
+                    break
+                time.sleep(0.01)
+
+            self.assertEqual('k', results[0][0])
+            self.assertIn(results[0][1], game.legal_moves(nick))
+        finally:
+            pool.close()
+
+if __name__ == '__main__':
+    unittest2.main()
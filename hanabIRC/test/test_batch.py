@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import random
+import unittest2
+import numpy as np
+from hanabi import Game, COLORS, RANKS
+from batch import BatchGame
+from simulate import cheat_policy
+from text_markup import text_markup_base
+
+class test_batch(unittest2.TestCase):
+
+    def newGame(self, seed, num_players, opts=None):
+        game = Game(seed)
+        game.markup = text_markup_base()
+        for i in xrange(num_players):
+            game.add_player('p%d' % i)
+
+        game.start_game('p0', opts)
+        return game
+
+    def assertSameState(self, game, batch, k):
+        self.assertEqual(game.score(), batch.score()[k])
+        self.assertEqual(game.notes, batch.notes[k])
+        self.assertEqual(game.storms, batch.storms[k])
+        self.assertEqual(list(game.table[:batch.num_colors]), list(batch.table[k]))
+        self.assertEqual(game.game_over(), batch.done[k])
+        p = batch.turn[k]
+        hand = [c.code for c in game._players[game.player_turn()].hand]
+        self.assertEqual(hand, list(batch.hands[k, p, :batch.hand_len[k, p]]))
+
+    def test_matches_game(self):
+        # play the same moves in Game and the batch and compare state.
+        for num_players, opts in [(2, None), (3, None), (5, {'rainbow_5': True})]:
+            games = [self.newGame(s, num_players, opts) for s in xrange(8)]
+            batch = BatchGame.from_games(games)
+            rng = random.Random(1)
+            while not batch.done.all():
+                K = batch.num_games
+                kinds = np.zeros(K, dtype=int)
+                slot = np.zeros(K, dtype=int)
+                target = np.zeros(K, dtype=int)
+                value = np.zeros(K, dtype=int)
+                for k, g in enumerate(games):
+                    if g.game_over():
+                        continue
+                    nick = g.player_turn()
+                    move = cheat_policy(g, nick, rng)
+                    hand = g._players[nick].hand
+                    if move[0] == 'hint':
+                        kinds[k] = BatchGame.HINT_NUMBER
+                        target[k] = g.turn_order.index(move[1])
+                        value[k] = move[2]
+                        g.hint_player(nick, move[1], move[2])
+                    else:
+                        kinds[k] = BatchGame.PLAY if move[0] == 'play' else BatchGame.DISCARD
+                        slot[k] = g._players[nick].card_index(move[1])
+                        if move[0] == 'play':
+                            g.play_card(nick, move[1])
+                        else:
+                            g.discard_card(nick, move[1])
+
+                batch.step(kinds, slot, target, value)
+                for k, g in enumerate(games):
+                    self.assertSameState(g, batch, k)
+
+    def test_invalid_actions(self):
+        batch = BatchGame.from_seeds(range(4), num_players=2)
+        batch.notes[:] = [0, 8, 8, 8]
+        kinds = [BatchGame.HINT_COLOR, BatchGame.HINT_COLOR, BatchGame.PLAY,
+                 BatchGame.HINT_NUMBER]
+        valid = batch.step(kinds, slot=[0, 0, 7, 0], target=[1, 0, 0, 1],
+                           value=[0, 0, 0, 6])
+        self.assertEqual([False] * 4, list(valid))
+        self.assertEqual([0] * 4, list(batch.turn))
+
+    def test_rules(self):
+        # the limits and hints come from the variant, as in hanabi.Game.
+        for opts in (None, {'rainbow_5': True}, {'rainbow_10': True}):
+            game = self.newGame(1, 4, opts)
+            batch = BatchGame.from_games([game])
+            self.assertIs(game.rules, batch.rules)
+            self.assertEqual((game.max_notes, game.max_storms, game.max_score, len(game.colors)),
+                             (batch.max_notes, batch.max_storms, batch.max_score, batch.num_colors))
+            self.assertEqual(4, batch.hand_size)
+
+            target = game.turn_order[1]
+            for i, color in enumerate(game.colors):
+                marks = [c.mark for c in game._players[target].hand
+                         if game.rules.hint_masks[color] & (1 << c.code)]
+                touched = batch.hint_matches(1, np.array([i]), np.array([BatchGame.HINT_COLOR]))[0]
+                self.assertEqual(marks, [c.mark for c, t in zip(game._players[target].hand, touched)
+                                         if t])
+
+if __name__ == '__main__':
+    unittest2.main()
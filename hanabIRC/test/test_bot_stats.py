@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import json
+import tempfile
+import unittest2
+from bot_stats import BotStats, Histogram
+
+class test_bot_stats(unittest2.TestCase):
+
+    def test_histogram(self):
+        h = Histogram()
+        for v in [0, 1, 3, 100, 5000]:
+            h.add(v)
+
+        self.assertEqual(5, h.n)
+        self.assertEqual(5000, h.max)
+        self.assertEqual(4, h.percentile(50))
+        self.assertEqual(8192, h.percentile(100))
+
+    def test_commands(self):
+        stats = BotStats()
+        stats.message_in('#hanabi')
+        stats.command_start('play')
+        stats.queued(3)
+        stats.output('#hanabi', 3, 0.0)
+        stats.command_end()
+        stats.output('#hanabi', 1, 0.0)    # outside a command
+        stats.command_end()                # does nothing
+
+        self.assertEqual(1, stats.commands['play'].count)
+        self.assertEqual(4, stats.lines_out['#hanabi'])
+        self.assertIn('#hanabi: 1 messages in, 4 lines out.', stats.report())
+
+        path = os.path.join(tempfile.mkdtemp(), 'stats.json')
+        stats.dump(path)
+        with open(path) as fd:
+            data = json.load(fd)
+
+        self.assertEqual(1, data['commands']['play']['count'])
+        self.assertEqual(3, data['queue_depth']['max'])
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import random
+import time
+import unittest2
+from deals import Forbid, Require, DealBank, deal
+from hanabi import Game, DealSpec, RANKS, card_code, deck_codes, new_deal
+
+class test_deals(unittest2.TestCase):
+
+    def test_constraints(self):
+        codes = deck_codes('rainbow 5')
+        rainbow_low = set(card_code('rainbow', n) for n in xrange(1, 5))
+        spec = DealSpec('rainbow 5', 4, ('no_critical_bottom', 'playable_first_hand'))
+        for seed in xrange(300):
+            d = new_deal(seed, spec)
+            self.assertEqual(sorted(codes), sorted(d))
+            self.assertNotIn(d[-1], rainbow_low)
+            self.assertTrue(any(c % RANKS == 0 for c in d[:4]))
+
+    def test_game(self):
+        for seed in xrange(20):
+            game = Game(seed)
+            game.game_option(['playable_first_hand'])
+            for p in ['p1', 'p2', 'p3']:
+                game.add_player(p)
+
+            game.start_game('p1', {'rainbow_5': True})
+            bottom = game.deck[-1]
+            self.assertFalse(bottom.color == 'rainbow' and bottom.number < 5)
+            first = game._players[game.turn_order[0]].hand
+            self.assertIn(1, [c.number for c in first])
+            self.assertEqual(50 + 5 - 15, len(game.deck))
+
+    def test_impossible(self):
+        self.assertRaises(ValueError, deal, random.Random(0), [1, 2, 3],
+                          [Forbid([0, 1], lambda c: c < 3)])
+        # the first require fills the only position of the second.
+        self.assertRaises(ValueError, deal, random.Random(0), range(10),
+                          [Require([0], lambda c: c == 7), Require([0], lambda c: c == 3)])
+        d = deal(random.Random(0), range(10), [Require([0], lambda c: c == 7)])
+        self.assertEqual(7, d[0])
+
+    def test_bank(self):
+        spec = DealSpec('standard', 3, ())
+        bank = DealBank(new_deal, depth=2, specs=[spec])
+        bank.start()
+        for i in xrange(100):
+            if bank.ready(spec) == 2:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(2, bank.ready(spec))
+        seed, d = bank.take(spec)
+        self.assertEqual(new_deal(seed, spec), d)
+
+        # games dealt from the bank replay from their seed.
+        game = Game(deal_bank=bank)
+        for p in ['p1', 'p2', 'p3']:
+            game.add_player(p)
+
+        game.start_game('p1')
+        replayed = Game.load(game.save())
+        self.assertEqual([c.code for c in game.deck], [c.code for c in replayed.deck])
+        self.assertEqual(game.turn_order, replayed.turn_order)
+
+if __name__ == '__main__':
+    unittest2.main()
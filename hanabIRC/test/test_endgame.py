@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import unittest2
+from ai_player import rollout_move
+from endgame import analyze
+from hanabi import MOVE_HINT_COLOR
+from solver import Solver, new_game
+
+def final_round(seed, num_players):
+    game = new_game(seed, num_players)
+    while game.last_round is None and not game.game_over():
+        game.apply(rollout_move(game, game.turn_order[0]))
+
+    return game
+
+class test_endgame(unittest2.TestCase):
+
+    def test_best_line(self):
+        # playing the line out reaches the score the solver gave.
+        for seed in xrange(10):
+            game = final_round(seed, 2 + seed % 4)
+            solver = Solver(game)
+            score, exact = solver.solve()
+            self.assertTrue(exact)
+            for turn, kind, code in solver.best_line():
+                nick = game.player_turn()
+                if kind == 2:
+                    game.apply([m for m in game.legal_moves(nick) if m >> 8 >= MOVE_HINT_COLOR][0])
+                    continue
+
+                mark = [c.mark for c in game._players[nick].hand if c.code == code][0]
+                if kind == 0:
+                    game.play_card(nick, mark)
+                else:
+                    game.discard_card(nick, mark)
+
+            self.assertEqual(score, game.played)
+
+    def test_analyze(self):
+        self.assertIsNone(analyze(new_game(0, 3)))
+        game = final_round(1, 3)
+        result = analyze(game)
+        self.assertTrue(result.exact)
+        self.assertGreaterEqual(result.score, game.played)
+        self.assertEqual(result.score - game.played,
+                         sum(1 for move in result.line if ' plays ' in move))
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -4,9 +4,12 @@ import os
 import sys
 sys.path.insert(0, os.path.join(sys.path[0], '..'))
 
+import random
 import unittest2
 from string import uppercase
-from hanabi import Game, Player, Card
+from hanabi import Game, Player, Card, COLORS, RANKS, MOVE_PLAY, MOVE_DISCARD, \
+    MOVE_HINT_COLOR, decode_move, possible_cards
+from simulate import cheat_policy
 from text_markup import xterm_markup, text_markup_base
 
 players = ['p1', 'p2']
@@ -45,6 +48,26 @@ class test_hanabi(unittest2.TestCase):
         print p.swap_cards('A', 'E')
         self.assertEqual('EBCDA', self.getBacks(p.hand))
 
+    def test_hand_cache(self):
+        p = Player(players[0])
+        for i, b in zip(xrange(1, 4), uppercase[:3]):
+            p.add_card(Card('red', i))
+
+        s = p.get_hand()
+        self.assertTrue(s is p.get_hand())
+        p.swap_cards('A', 'C')
+        self.assertEqual('CBA', self.getBacks(p.hand))
+        self.assertNotEqual(s, p.get_hand())
+        self.assertTrue(p.get_hand(hidden=True).endswith('CBA'))
+
+    def test_events(self):
+        self.setUpGame()
+        nick = self.game.player_turn()
+        events = self.game._discard(nick, 0)
+        self.assertEqual(['CardDiscarded', 'CardDrawn', 'TableState'],
+                         [type(e).__name__ for e in events])
+        self.assertEqual(nick, events[0].nick)
+
     def test_play(self):
         self.setUpGame()
         print self.game.turn()
@@ -122,6 +145,37 @@ class test_hanabi(unittest2.TestCase):
         gr = self.game.hints(p2)
         self.assertTrue(len(gr.private[p2]) == 3)
 
+        # all hints in the order given, and by turn.
+        gr = self.game.hints(p1, show_all=True)
+        self.assertEqual(['Turn %d' % t for t in xrange(1, 6)],
+                         [h.split(':')[0] for h in gr.private[p1]])
+        self.assertEqual([1, 3, 5], [t for t, e in self.game.hint_log if e.player == p2])
+        gr = self.game.hints(p2, first=2, last=4)
+        self.assertEqual(['Turn 3'], [h.split(':')[0] for h in gr.private[p2]])
+        gr = self.game.hints(p2, first=6)
+        self.assertEqual(['No hints were given on those turns.'], gr.private[p2])
+
+    def test_hand_changes(self):
+        self.setUpGame()
+        self.game.game_option(['hand_changes'])
+        p1, p2 = self.game.turn_order[0], self.game.turn_order[1]
+        self.game.add_watcher('henry')
+
+        # shown in full the first time, then only what was drawn.
+        gr = self.game.discard_card(p1, 'A')
+        self.assertTrue(gr.private['henry'][0].startswith('Current hands:'))
+        gr = self.game.hint_player(p2, p1, 5)
+        self.assertFalse(any(l.startswith(('Current hands:', 'Hand changes:'))
+                             for ls in gr.private.values() for l in ls))
+        gr = self.game.discard_card(p1, 'B')
+        card = self.game._players[p1].hand[-1]
+        self.assertEqual(['Hand changes: %s drew %s' % (p1, card)], gr.private['henry'])
+        self.assertEqual('Hand changes: %s drew %s' % (p1, card.mark), gr.private[p1][0])
+
+        # !hands still shows them all.
+        gr = self.game.get_hands('henry')
+        self.assertTrue(gr.private['henry'][0].startswith('Current hands:'))
+
     def test_watch(self):
         self.setUpGame()
         p1 = self.game.turn_order[0]
@@ -144,7 +198,7 @@ class test_hanabi(unittest2.TestCase):
             c.markup = xterm_markup()
 
         opts = {'rainbow_5': True}
-        game.options['solvable_rainbow_5'] = True
+        game.options['solvable_rainbow_5']['value'] = True
         bad_card = Card('rainbow', 1)
         bad_card.markup = xterm_markup()
         game.deck[len(game.deck)-1] = bad_card
@@ -159,6 +213,282 @@ class test_hanabi(unittest2.TestCase):
         self.assertFalse(last_card.color == 'rainbow' and 
                          last_card.number in [1,2,3,4])
 
+    def getState(self, game):
+        hands = dict((n, [(c.code, c.mark) for c in p.hand])
+                     for n, p in game._players.iteritems())
+        return (hands, [c.code for c in game.deck], list(game.turn_order),
+                list(game.table), game.notes, game.storms, game.last_round,
+                game.game_over(), game.score(), list(game.discards))
+
+    def playRandomGame(self, seed):
+        rng = random.Random(seed)
+        game = Game(seed)
+        game.markup = xterm_markup()
+        for p in ['p1', 'p2', 'p3', 'p4']:
+            game.add_player(p)
+
+        game.game_option(['repeat_backs'])
+        game.start_game('p1', {'rainbow_5': True})
+        game.remove_player('p4')
+        while not game.game_over():
+            nick = game.player_turn()
+            marks = [c.mark for c in game._players[nick].hand]
+            action = rng.choice(['play', 'discard', 'hint', 'swap', 'move', 'sort'])
+            if action == 'play':
+                game.play_card(nick, rng.choice(marks))
+            elif action == 'discard':
+                game.discard_card(nick, rng.choice(marks))
+            elif action == 'hint':
+                other = rng.choice([p for p in game.turn_order if p != nick])
+                game.hint_player(nick, other, rng.choice(['r', 'blue', 'rainbow', 1, '3']))
+            elif action == 'swap':
+                game.swap_cards(nick, rng.choice(marks), rng.choice(marks))
+            elif action == 'move':
+                game.move_card(nick, rng.choice(marks), rng.randint(1, len(marks)))
+            else:
+                game.sort_cards(nick)
+
+        return game
+
+    def test_seeded(self):
+        g1, g2 = Game(42), Game(42)
+        for g in [g1, g2]:
+            for p in players:
+                g.add_player(p)
+            g.start_game(players[0])
+
+        self.assertEqual(self.getState(g1), self.getState(g2))
+
+    def test_replay(self):
+        for seed in xrange(20):
+            game = self.playRandomGame(seed)
+            replayed = Game.replay(game.seed, game.actions)
+            self.assertEqual(self.getState(game), self.getState(replayed))
+
+            record = game.save()
+            self.assertEqual(self.getState(game), self.getState(Game.load(record)))
+
+    def playCheatGame(self, seed):
+        '''Play a game that gets far, so 5s are played.'''
+        rng = random.Random(seed)
+        game = Game(seed)
+        for p in ['p1', 'p2', 'p3']:
+            game.add_player(p)
+
+        game.start_game('p1')
+        while not game.game_over():
+            nick = game.player_turn()
+            move = cheat_policy(game, nick, rng)
+            if move[0] == 'play':
+                game.play_card(nick, move[1])
+            elif move[0] == 'discard':
+                game.discard_card(nick, move[1])
+            else:
+                game.hint_player(nick, move[1], move[2])
+
+        return game
+
+    def test_counters(self):
+        # replay the action log, recounting the table, notes and storms
+        # from the cards played and discarded, and check the counters the
+        # game keeps after every action.
+        misplays = fives = 0
+        for seed in xrange(6):
+            game = self.playRandomGame(seed) if seed % 2 else self.playCheatGame(seed)
+            replay = Game(game.seed)
+            table, notes, storms = None, None, None
+            for action in game.actions:
+                kind, nick = action[0], action[1]
+                if kind in 'pd':
+                    p = replay._players[nick]
+                    card = p.hand[p.card_index(action[2])]
+
+                replay._do(action)
+                if kind == 'S':
+                    table, notes, storms = [0] * len(COLORS), replay.max_notes, 0
+                elif kind == 'p' and table[card.code // RANKS] == card.number - 1:
+                    table[card.code // RANKS] += 1
+                    if card.number == RANKS and notes < replay.max_notes:
+                        notes += 1
+                        fives += 1
+                elif kind == 'p':
+                    storms += 1
+                    misplays += 1
+                elif kind == 'd':
+                    notes = min(notes + 1, replay.max_notes)
+                elif kind == 'h':
+                    notes -= 1
+
+                if table is not None:
+                    self.assertEqual(table, replay.table)
+                    self.assertEqual(sum(table), replay.played)
+                    self.assertEqual((notes, storms), (replay.notes, replay.storms))
+                    self.assertEqual(sum(replay.discards),
+                                     sum(1 for a in replay.actions if a[0] == 'd') + storms)
+
+            self.assertEqual(replay.played, game.played)
+            self.assertEqual(replay.max_score, game.max_score)
+
+        # the games had both.
+        self.assertTrue(misplays and fives)
+
+    def test_fork(self):
+        game = Game.load(self.playRandomGame(11).save(), upto=20)
+        before = self.getState(game)
+        fork = game.fork()
+        self.assertEqual(before, self.getState(fork))
+
+        while not fork.game_over():
+            nick = fork.player_turn()
+            fork.discard_card(nick, fork._players[nick].hand[0].mark)
+
+        self.assertEqual(before, self.getState(game))
+        self.assertNotEqual(before, self.getState(fork))
+
+        # both games draw the same cards from here on.
+        game.restore(fork)
+        self.assertEqual(self.getState(fork), self.getState(game))
+        snapshot = Game.load(self.playRandomGame(11).save(), upto=20)
+        game.restore(snapshot)
+        self.assertEqual(before, self.getState(game))
+
+    def test_legal_moves(self):
+        game = Game.load(self.playRandomGame(5).save(), upto=25)
+        nick = game.player_turn()
+        self.assertEqual([], game.legal_moves(game.turn_order[1]))
+
+        moves = game.legal_moves(nick)
+        self.assertEqual(len(moves), len(set(moves)))
+        for move in moves:
+            kind, target, value = decode_move(move)
+            fast, slow = game.fork(), game.fork()
+            fast.apply(move)
+            if kind == MOVE_PLAY:
+                slow.play_card(nick, game._players[nick].hand[value].mark)
+            elif kind == MOVE_DISCARD:
+                slow.discard_card(nick, game._players[nick].hand[value].mark)
+            else:
+                hint = COLORS[value] if kind == MOVE_HINT_COLOR else value
+                player = game.turn_order[target]
+                self.assertTrue(game._get_cards(player, hint))
+                slow.hint_player(nick, player, hint)
+
+            self.assertEqual(self.getState(slow), self.getState(fast))
+            self.assertEqual(slow.actions, fast.actions)
+
+        game.notes = 0
+        self.assertEqual(2 * len(game._players[nick].hand), len(game.legal_moves(nick)))
+
+    def test_knowledge(self):
+        game = Game(3)
+        for p in players:
+            game.add_player(p)
+
+        game.start_game(players[0])
+        nick, other = game.turn_order
+        hand = game._players[other].hand
+        self.assertEqual([25] * len(hand), [len(possible_cards(m)) for _, m in
+                                            game.card_knowledge(other)])
+
+        color, number = hand[0].color, hand[1].number
+        game.hint_player(nick, other, color)
+        game.hint_player(other, nick, 1)
+        game.hint_player(nick, other, number)
+        for c, (mark, mask) in zip(hand, game.card_knowledge(other)):
+            self.assertEqual(c.mark, mark)
+            self.assertIn(c.code, possible_cards(mask))
+            for code in possible_cards(mask):
+                self.assertEqual(c.color == color, COLORS[code // 5] == color)
+                self.assertEqual(c.number == number, code % 5 + 1 == number)
+
+        # a new card knows nothing.
+        game.discard_card(other, hand[0].mark)
+        self.assertEqual(25, len(possible_cards(game.card_knowledge(other)[-1][1])))
+        self.assertIn('The hints say %s\'s cards are' % other,
+                      game.get_knowledge(nick, other).private[nick][0])
+
+    def test_copies_left(self):
+        game = self.playRandomGame(11)
+        cards = [c.code for p in game._players.values() for c in p.hand]
+        cards += [c.code for c in game.deck]
+        for color in game.colors:
+            for n in xrange(1, 6):
+                code = COLORS.index(color) * 5 + n - 1
+                self.assertEqual(cards.count(code), game.copies_left(color, n))
+
+        # the rendered discard pile follows the counts.
+        self.assertIn(game._get_discards_string(), game.get_table().public)
+        game._discard(game.player_turn(), 0)
+        self.assertIn(game._get_discards_string(), game.get_table().public)
+        game.markup = text_markup_base()
+        digits = [ch for ch in game._get_discards_string() if ch.isdigit()]
+        self.assertEqual(sum(game.discards), len(digits))
+
+    def test_odds(self):
+        # the counts kept as cards move match a count from scratch.
+        game = self.playRandomGame(5)
+        unseen = game.unseen
+        game._count_unseen()
+        self.assertEqual(unseen, game.unseen)
+
+        game = Game(5)
+        for p in ['p1', 'p2', 'p3']:
+            game.add_player(p)
+
+        game.start_game('p1')
+        for i in xrange(6):
+            game.discard_card(game.player_turn(), 'A')
+
+        game.hint_player(game.player_turn(), game.turn_order[1], 1)
+        nick = game.player_turn()
+        hand = game._players[nick].hand
+        codes = [c.code for c in hand] + [c.code for c in game.deck]
+        odds, playable = game.card_odds(nick, 0)
+        self.assertAlmostEqual(1.0, sum(p for code, p in odds))
+        self.assertIn(hand[0].code, [code for code, p in odds])
+        self.assertEqual([codes.count(code) for code in xrange(len(COLORS) * 5)],
+                         game.unseen[nick])
+
+        self.assertTrue(0 <= playable <= 1)
+        self.assertIn('The chance it can be played now is',
+                      game.get_odds(nick, hand[0].mark).private[nick][0])
+
+    def test_player_index(self):
+        rng = random.Random(0)
+        for reuse in (True, False):
+            p = Player('p')
+            marks = []
+            for i in xrange(300):
+                if len(p.hand) < 5:
+                    p.add_card(Card(rng.choice(COLORS), rng.randint(1, 5)), reuse)
+                    marks.append(p.hand[-1].mark)
+
+                action = rng.choice(['remove', 'swap', 'move', 'sort'])
+                hand = [c.mark for c in p.hand]
+                if action == 'remove':
+                    p.remove_card(rng.randrange(len(hand)))
+                elif action == 'swap':
+                    p.swap_cards(rng.choice(hand), rng.choice(hand))
+                elif action == 'move':
+                    p.move_card(rng.choice(hand), rng.randint(1, len(hand)))
+                else:
+                    p.sort_cards()
+
+                for j, c in enumerate(p.hand):
+                    self.assertEqual(j, p.card_index(c.mark.lower()))
+                self.assertEqual(sorted(c.mark for c in p.hand),
+                                 [m for i, m in enumerate(uppercase) if p.used >> i & 1])
+
+            # reused marks stay in A-E, the others go round the alphabet.
+            self.assertEqual(set('ABCDE' if reuse else uppercase), set(marks))
+
+    def test_replay_upto(self):
+        game = self.playRandomGame(7)
+        moves = [i for i, a in enumerate(game.actions) if a[0] in 'pdh']
+        partial = Game.load(game.save(), upto=moves[3])
+        self.assertEqual(3, len([a for a in partial.actions if a[0] in 'pdh']))
+        self.assertFalse(partial.game_over())
+
 if __name__ == '__main__':
     unittest2.main()
 
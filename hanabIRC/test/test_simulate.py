@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import unittest2
+from hanabi import Card
+from simulate import cheat_policy, play_game, simulate
+
+class test_simulate(unittest2.TestCase):
+
+    def test_simulate(self):
+        markup = Card._markup
+        results, elapsed = simulate(12, 3, 'cheat', seed=5, processes=1, chunk_size=5)
+        self.assertIs(markup, Card._markup)
+        self.assertEqual(12, results.games)
+        self.assertEqual(12, sum(results.scores.values()))
+        self.assertEqual(results.moves, sum(results.latency))
+        self.assertTrue(all(0 <= s <= 25 for s in results.scores))
+
+        # the same seeds play the same games.
+        again, elapsed = simulate(12, 3, 'cheat', seed=5, processes=1, chunk_size=5)
+        self.assertEqual(results.moves, again.moves)
+        self.assertEqual(dict(results.scores), dict(again.scores))
+
+        for seed in xrange(3):
+            a, b = play_game(seed, 4, cheat_policy), play_game(seed, 4, cheat_policy)
+            self.assertEqual((a['score'], a['moves']), (b['score'], b['moves']))
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import random
+import unittest2
+from hanabi import MOVE_HINT_COLOR
+from solver import max_score, new_game
+from simulate import random_policy
+
+class test_solver(unittest2.TestCase):
+
+    def bruteForce(self, game):
+        '''Best score by trying every play and discard and one hint.'''
+        if game.game_over():
+            return game.score()
+
+        moves = game.legal_moves(game.player_turn())
+        hints = [m for m in moves if m >> 8 >= MOVE_HINT_COLOR]
+        best = 0
+        for m in [m for m in moves if m >> 8 < MOVE_HINT_COLOR] + hints[:1]:
+            f = game.fork()
+            f.apply(m)
+            best = max(best, self.bruteForce(f))
+
+        return best
+
+    def test_endgames(self):
+        # play randomly until the deck is nearly gone, then compare.
+        for seed in xrange(10):
+            rng = random.Random(seed)
+            game = new_game(seed, 2 + seed % 3)
+            while not game.game_over() and len(game.deck) > 1:
+                nick = game.player_turn()
+                move = random_policy(game, nick, rng)
+                if move[0] == 'play':
+                    game.play_card(nick, move[1])
+                elif move[0] == 'discard':
+                    game.discard_card(nick, move[1])
+                else:
+                    game.hint_player(nick, move[1], move[2])
+
+            game.notes = min(game.notes, 1)
+            self.assertEqual(max_score(game), (self.bruteForce(game), True))
+
+    def test_new_deals(self):
+        for seed in xrange(5):
+            game = new_game(seed, 3)
+            score, exact = max_score(game)
+            self.assertTrue(exact)
+            self.assertEqual(score, 25)
+            self.assertEqual(game.played, 0)
+            self.assertEqual(len(game.deck), 35)
+
+    def test_budget(self):
+        score, exact = max_score(new_game(0, 3), max_nodes=10)
+        self.assertFalse(exact)
+        self.assertTrue(0 <= score <= 25)
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import unittest2
+from text_markup import irc_markup
+from transport import OutputQueue, room, split
+
+class FakeConnection(object):
+    def __init__(self):
+        self.sent = []
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    def privmsg(self, target, line):
+        self.sent.append(('privmsg', target, line))
+
+    def notice(self, target, line):
+        self.sent.append(('notice', target, line))
+
+class test_transport(unittest2.TestCase):
+
+    def test_rate(self):
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=2, burst=2)
+        for i in xrange(6):
+            out.privmsg('#a', 'line %d' % i)
+        self.assertEqual(6, out.pending())
+        self.assertEqual([], conn.sent)
+
+        # the burst goes out at once, then a line every 1/rate seconds.
+        out.flush(100.0)
+        self.assertEqual(2, len(conn.sent))
+        out.flush(100.25)
+        self.assertEqual(2, len(conn.sent))
+        out.flush(100.5)
+        self.assertEqual(3, len(conn.sent))
+
+        # an idle spell refills the bucket, but never past burst.
+        out.flush(110.0)
+        self.assertEqual(5, len(conn.sent))
+        out.flush(110.5)
+        self.assertEqual(['line %d' % i for i in xrange(6)], [l for _, _, l in conn.sent])
+        self.assertEqual(0, out.pending())
+
+    def test_fair(self):
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=1, burst=1)
+        for i in xrange(3):
+            out.privmsg('#a', 'a%d' % i)
+        out.privmsg('#b', 'b0')
+        out.notice('bob', 'hands')
+        out.notice('bob', 'your turn', urgent=True)
+        self.assertEqual(2, out.pending('bob'))
+
+        for t in xrange(6):
+            out.flush(float(t))
+
+        # urgent first, with what was queued before it to bob, then the
+        # targets in turn.
+        self.assertEqual(['hands', 'your turn', 'a0', 'b0', 'a1', 'a2'],
+                         [l for _, _, l in conn.sent])
+
+    def test_order(self):
+        # an urgent line does not overtake what was queued to its target.
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=1, burst=1, separator=' | ')
+        out.privmsg('#a', 'a0')
+        out.privmsg('#b', 'b0')
+        out.privmsg('#b', 'b1', urgent=True)
+        out.notice('bob', 'your turn', urgent=True)
+        for t in xrange(3):
+            out.flush(float(t))
+
+        self.assertEqual(['b0 | b1', 'your turn', 'a0'], [l for _, _, l in conn.sent])
+
+    def test_split(self):
+        m = irc_markup()
+        line = ' '.join('%s %s' % (m.color('RR%d' % (i % 5 + 1), 'red'), m.bold('bold text'))
+                        for i in xrange(40))
+        pieces = split(line, 100)
+        self.assertGreater(len(pieces), 1)
+        self.assertTrue(all(len(p) <= 100 for p in pieces))
+        # cut at spaces outside the formatting, so nothing is lost but them.
+        self.assertEqual(line, ' '.join(pieces))
+
+        # formatting open at a cut is closed, then opened again.
+        pieces = split('\x034,1' + 'x' * 30, 12)
+        self.assertTrue(pieces[0].endswith('\x0f'))
+        self.assertTrue(all(p.startswith('\x0304,01') for p in pieces[1:]))
+        self.assertEqual(30, sum(p.count('x') for p in pieces))
+
+        self.assertEqual(['short'], split('short', 100))
+
+    def test_coalesce(self):
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=1, burst=1, separator=' | ')
+        for i in xrange(3):
+            out.privmsg('#a', 'line %d' % i)
+        out.notice('#a', 'a notice')
+        out.privmsg('#a', 'x' * 300)
+        out.privmsg('#a', 'y' * 300)
+        out.privmsg('#a', 'z' * 1000)
+
+        for t in xrange(10):
+            out.flush(float(t))
+
+        self.assertEqual(('privmsg', '#a', 'line 0 | line 1 | line 2'), conn.sent[0])
+        self.assertEqual(('notice', '#a', 'a notice'), conn.sent[1])
+        self.assertEqual(['x' * 300, 'y' * 300], [l for _, _, l in conn.sent[2:4]])
+        self.assertTrue(all(len(l) <= room('privmsg', '#a') for _, _, l in conn.sent))
+        self.assertEqual(1000, sum(l.count('z') for _, _, l in conn.sent))
+
+    def test_no_join(self):
+        # services take one command a message.
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=1, burst=1, separator=' | ')
+        out.privmsg('ChanServ', 'voice #h alice', join=False)
+        out.privmsg('ChanServ', 'voice #h bob', join=False)
+        out.privmsg('#h', 'a')
+        out.privmsg('#h', 'b')
+        for t in xrange(4):
+            out.flush(float(t))
+
+        self.assertEqual([('privmsg', 'ChanServ', 'voice #h alice'),
+                          ('privmsg', '#h', 'a | b'),
+                          ('privmsg', 'ChanServ', 'voice #h bob')], conn.sent)
+
+    def test_clock_back(self):
+        conn = FakeConnection()
+        out = OutputQueue(conn, rate=2, burst=1)
+        out.privmsg('#a', 'before')
+        out.flush(2000.0)
+        # the clock steps back a long way.
+        out.flush(1000.0)
+        out.notice('bob', 'your turn', urgent=True)
+        out.flush(1000.5)
+        self.assertEqual(['before', 'your turn'], [l for _, _, l in conn.sent])
+
+    def test_disconnected(self):
+        conn = FakeConnection()
+        conn.connected = False
+        out = OutputQueue(conn)
+        out.privmsg('#a', 'hello')
+        out.flush(1.0)
+        self.assertEqual(1, out.pending())
+        conn.connected = True
+        out.flush(2.0)
+        self.assertEqual(0, out.pending())
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import sys
+sys.path.insert(0, os.path.join(sys.path[0], '..'))
+
+import unittest2
+from hanabi import Game, MOVE_HINT_COLOR, card_code
+from variants import COLORS, RANKS, Rules, rules, rules_for_options, suit, variant
+
+class test_variants(unittest2.TestCase):
+
+    def test_rules(self):
+        for name, size, max_score in [('standard', 50, 25), ('rainbow 5', 55, 30),
+                                      ('rainbow 10', 60, 30)]:
+            r = rules(name)
+            self.assertIs(r, rules(name))
+            self.assertEqual(size, len(r.codes))
+            self.assertEqual(size, sum(r.copies))
+            self.assertEqual(max_score, r.max_score)
+
+        self.assertIs(rules('rainbow 10'), rules_for_options(['rainbow_10']))
+        self.assertIs(rules('standard'), rules_for_options([]))
+
+        r = rules('rainbow 5')
+        self.assertEqual(1, r.copies[card_code('rainbow', 1)])
+        self.assertEqual(3, r.copies[card_code('red', 1)])
+        self.assertEqual(1 << card_code('red', 1), r.hint_masks['red'] & r.hint_masks[1])
+        self.assertFalse(r.hint_masks['red'] & r.hint_masks['rainbow'])
+
+    def test_touched_by(self):
+        # rainbow cards that every color hint touches.
+        suits = [suit(c) for c in COLORS[:5]]
+        suits.append(suit('rainbow', abbrev='M', touched_by=COLORS[:5]))
+        r = Rules(variant('multi', suits, option='multi'))
+        rainbow = ((1 << RANKS) - 1) << (5 * RANKS)
+        self.assertEqual(rainbow, r.hint_masks['blue'] & rainbow)
+        self.assertFalse(r.hint_masks['rainbow'] & ~rainbow)
+
+        self.assertRaises(ValueError, Rules, variant('bad', [suit('blue')]))
+
+    def test_game(self):
+        game = Game(0)
+        for p in ['p1', 'p2', 'p3', 'p4']:
+            game.add_player(p)
+
+        game.start_game('p1', {'rainbow_10': True})
+        self.assertEqual('rainbow 10', game.game_type())
+        self.assertEqual(30, game.max_score)
+        self.assertEqual(60 - 16, len(game.deck))
+        self.assertEqual(COLORS, game.colors)
+
+    def test_legal_hints(self):
+        # rainbow cards every color hint touches: a hand with a rainbow card
+        # can be given a hint of any color, including ones not in it.
+        suits = [suit(c) for c in COLORS[:5]]
+        suits.append(suit('rainbow', abbrev='M', touched_by=COLORS[:5]))
+        multi = Rules(variant('multi', suits, option='multi'))
+        for seed in xrange(20):
+            game = Game(seed)
+            for p in ['p1', 'p2']:
+                game.add_player(p)
+            game.start_game('p1', {'rainbow_10': True})
+            game.rules = multi
+
+            hand = game._players[game.turn_order[1]].hand
+            if not any(c.color == 'rainbow' for c in hand):
+                continue
+
+            hinted = set(m & 31 for m in game.legal_moves(game.player_turn())
+                         if m >> 8 == MOVE_HINT_COLOR)
+            # no hint is called rainbow in this variant.
+            self.assertEqual(set(range(5)), hinted)
+            self.assertLess(len(set(c.color for c in hand)), 6)
+            return
+
+        self.fail('no hand with a rainbow card')
+
+if __name__ == '__main__':
+    unittest2.main()
@@ -0,0 +1,241 @@
+'''
+    transport.py queues the bot's output so sending never holds up reading
+    and handling commands.
+
+    The bot used to rate limit with the irc library's
+    ServerConnection.set_rate_limit(), which sleeps in send_raw() until the
+    next line may go out. Every handler that answered with a big table
+    stopped the whole bot, and the games in every other channel with it.
+
+    Now a handler only puts its lines on an OutputQueue and returns. The
+    bot's event loop calls OutputQueue.flush() every time round, which
+    sends the lines that are due and returns at once. Reading, dispatch
+    and writing all run in the one event loop
+    (irc.client.IRC.process_forever()), but no step in it waits on the
+    rate limit.
+
+    The queue is fair between targets and lets urgent lines jump ahead:
+
+    * each target (channel or nick) has its own queue and flush() takes
+      one line from each target in turn, so the end of a game in one
+      channel does not hold up the games in the others.
+    * a line is URGENT or BULK. Every urgent line is sent before any bulk
+      line: a player waiting on "It is your turn" does not wait behind
+      someone else's hands or hint history. Lines to one target are still
+      sent in the order they were queued: an urgent line takes the bulk
+      lines queued before it to the same target with it.
+    * lines are paid for from a token bucket that holds burst tokens and
+      refills at rate tokens a second. That is how IRC servers limit
+      floods, so a short reply goes out at once while a long dump is
+      paced at the rate.
+
+    A server counts messages, not bytes, so the queue also sends as few
+    messages as it can. When a target's next line is sent, the lines
+    queued behind it for the same target are joined on to it, with a
+    separator between them, as long as the message stays within the 512
+    bytes IRC allows. A line too long for one message is split. split()
+    knows the mIRC bold, underline, reverse, italic and color codes that
+    text_markup.irc_markup writes: it never cuts one in half, and formatting
+    open at a cut is closed at the end of the piece and opened again at the
+    start of the next one.
+'''
+import logging
+import re
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# priorities of a line, highest first.
+URGENT = 0
+BULK = 1
+
+# the most bytes in an IRC message, the CR LF at the end included.
+MESSAGE_BYTES = 512
+# room left for the ":nick!user@host " the server puts in front of a
+# message when it passes it on.
+PREFIX_BYTES = 120
+
+BOLD, COLOR, RESET, REVERSE, ITALIC, UNDERLINE = '\x02', '\x03', '\x0f', '\x16', '\x1d', '\x1f'
+_TOGGLES = BOLD + REVERSE + ITALIC + UNDERLINE
+
+# a color code (with its numbers), another formatting code or a character.
+_atoms = re.compile(r'\x03(?:(\d{1,2})(?:,(\d{1,2}))?)?|[\x02\x0f\x16\x1d\x1f]|.', re.DOTALL)
+
+def _size(text):
+    return len(text.encode('utf-8')) if isinstance(text, unicode) else len(text)
+
+def room(method, target):
+    '''Return the most bytes of text one method (privmsg or notice)
+    message to target can carry.'''
+    return MESSAGE_BYTES - PREFIX_BYTES - len('%s %s :\r\n' % (method.upper(), target))
+
+def split(line, size):
+    '''Return line cut into pieces of at most size bytes, at spaces where it
+    can. Formatting open at a cut is closed and opened again.'''
+    if _size(line) <= size:
+        return [line]
+
+    # the atoms of line, and the codes that open the formatting in effect
+    # after each of them.
+    atoms, opens = [], []
+    toggles, color = '', ''
+    for m in _atoms.finditer(line):
+        atom = m.group(0)
+        if atom == RESET:
+            toggles, color = '', ''
+        elif atom[0] == COLOR:
+            # two digits, so a number in the text after it is not read as
+            # part of the code.
+            color = COLOR + ''.join(f % int(n) for f, n in zip(('%02d', ',%02d'), m.groups())
+                                    if n is not None) if m.group(1) else ''
+        elif atom in _TOGGLES:
+            toggles = toggles.replace(atom, '') if atom in toggles else toggles + atom
+
+        atoms.append(atom)
+        opens.append(toggles + color)
+
+    pieces = []
+    i = 0
+    while i < len(atoms):
+        prefix = opens[i-1] if i else ''
+        used = _size(prefix)
+        # find the longest run from i that fits with a reset on the end,
+        # noting the last space in it, and the last with no formatting.
+        j, space, plain = i, None, None
+        while j < len(atoms):
+            end = 1 if opens[j] else 0
+            if used + _size(atoms[j]) + end > size:
+                break
+            used += _size(atoms[j])
+            if atoms[j] == ' ' and j > i:
+                space = j
+                if not opens[j]:
+                    plain = j
+            j += 1
+
+        if j == len(atoms):
+            cut = resume = j
+        elif space is not None:
+            cut = plain if plain is not None else space
+            resume = cut + 1
+        else:
+            cut = resume = max(j, i + 1)
+
+        piece = prefix + ''.join(atoms[i:cut])
+        if cut < len(atoms) and opens[cut-1]:
+            piece += RESET
+        pieces.append(piece)
+        i = resume
+
+    return pieces
+
+class OutputQueue(object):
+    '''Lines for the IRC server, sent at no more than rate lines a second
+    after a burst of at most burst lines.
+
+    privmsg() and notice() take the same arguments as the
+    ServerConnection methods of the same name, plus optional urgent and
+    join flags, so code can send through either.
+
+    If separator is given, lines queued for the same target are joined
+    with it into as few messages as fit. A line queued with join=False,
+    like a command to a service, is always sent on its own.'''
+    def __init__(self, connection, rate=2.0, burst=1, separator=None):
+        self.connection = connection
+        self.separator = separator
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = None
+        # by priority: target -> deque of (method name, target, line, join), and
+        # the targets with lines waiting, in the order they are served.
+        self._queues = [dict(), dict()]
+        self._rotation = [deque(), deque()]
+        self._pending = 0
+        self.sent = 0
+
+    def privmsg(self, target, line, urgent=False, join=True):
+        self._put(('privmsg', target, line, join), URGENT if urgent else BULK)
+
+    def notice(self, target, line, urgent=False, join=True):
+        self._put(('notice', target, line, join), URGENT if urgent else BULK)
+
+    def _put(self, item, priority):
+        method, target, line, join = item
+        queues = self._queues[priority]
+        if not target in queues:
+            queues[target] = deque()
+            self._rotation[priority].append(target)
+
+        if priority == URGENT and target in self._queues[BULK]:
+            queues[target].extend(self._queues[BULK].pop(target))
+            self._rotation[BULK].remove(target)
+
+        pieces = split(line, room(method, target))
+        queues[target].extend((method, target, p, join) for p in pieces)
+        self._pending += len(pieces)
+
+    def _next(self):
+        '''Remove and return the next line to send: the first urgent target
+        in turn, else the first bulk one.'''
+        for queues, rotation in zip(self._queues, self._rotation):
+            if rotation:
+                target = rotation.popleft()
+                lines = queues[target]
+                item = lines.popleft()
+                self._pending -= 1
+                if self.separator is not None and item[3]:
+                    item = self._join(item, lines)
+
+                if lines:
+                    rotation.append(target)
+                else:
+                    del queues[target]
+
+                return item
+
+        return None
+
+    def _join(self, item, lines):
+        '''Join the lines after item in lines on to it while they fit.'''
+        method, target, line, join = item
+        size = room(method, target)
+        used = _size(line)
+        joined = [line]
+        while lines and lines[0][0] == method and lines[0][3]:
+            add = _size(self.separator) + _size(lines[0][2])
+            if used + add > size:
+                break
+
+            used += add
+            joined.append(lines.popleft()[2])
+            self._pending -= 1
+
+        return (method, target, self.separator.join(joined), join)
+
+    def pending(self, target=None):
+        '''Return the number of lines waiting to be sent, to target if given.'''
+        if target is None:
+            return self._pending
+
+        return sum(len(q[target]) for q in self._queues if target in q)
+
+    def flush(self, now=None):
+        '''Send the lines that are due. Never waits.'''
+        now = time.time() if now is None else now
+        if self._last is not None:
+            # Python 2 has no monotonic clock, so a clock stepped back
+            # counts as no time passing rather than as a debt.
+            elapsed = max(0.0, now - self._last)
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._last = now
+
+        if not self._pending or not self.connection.is_connected():
+            return
+
+        while self._pending and self._tokens >= 1:
+            method, target, line, join = self._next()
+            getattr(self.connection, method)(target, line)
+            self._tokens -= 1
+            self.sent += 1
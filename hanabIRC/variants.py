@@ -0,0 +1,147 @@
+'''
+    variants.py describes the kinds of game of Hanabi the bot can run and
+    compiles each description into the lookup tables hanabi.Game uses.
+
+    A Variant is data: its suits (a color, how the color is shown on a
+    card, the numbers in the suit and which color hints touch it), the
+    hand size for each number of players, the number of note and storm
+    tokens and the deal constraints its options turn on. A new variant is
+    a new entry in VARIANTS, not new string checks in the game.
+
+    rules(name) compiles a variant once into a Rules instance: the deck,
+    the copies of each card, the possibility mask of a hint (which is also
+    how the cards a hint touches are found), the max score and so on. The
+    game then looks things up instead of asking what variant it is.
+
+    Cards are identified by code everywhere: color index * RANKS + (number
+    - 1), the color index being the position of the color in COLORS. The
+    suits of a variant must be the first colors of COLORS, in order, as
+    batch.py and solver.py keep the table for the first len(suits) colors
+    only.
+'''
+import logging
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+COLORS = ['red', 'white', 'blue', 'green', 'yellow', 'rainbow']
+RANKS = 5
+
+# the numbers of the cards in a suit.
+STANDARD_DISTRIBUTION = (1, 1, 1, 2, 2, 3, 3, 4, 4, 5)
+SINGLE_DISTRIBUTION = (1, 2, 3, 4, 5)
+
+Suit = namedtuple('Suit', 'color abbrev distribution touched_by')
+
+def suit(color, distribution=STANDARD_DISTRIBUTION, abbrev=None, touched_by=None):
+    '''A suit is touched by hints of its own color unless touched_by is given.'''
+    return Suit(color, abbrev if abbrev else color[0].upper(), tuple(distribution),
+                tuple(touched_by) if touched_by else (color,))
+
+# name is the game type as shown and kept in the game history. option is
+# the !start option that picks the variant, None for the default game.
+# constraint_options maps game option -> (deal constraint the option turns
+# on, warning shown at the start of the game when it is on). announce is
+# shown at the start of the game, perfect at the end of a perfect game.
+Variant = namedtuple('Variant', 'name option suits hand_sizes max_notes max_storms '
+                     'constraint_options announce perfect')
+
+def variant(name, suits, option=None, hand_sizes=None, max_notes=8, max_storms=3,
+            constraint_options=None, announce=(), perfect='A perfect score!'):
+    return Variant(name, option, tuple(suits),
+                   hand_sizes if hand_sizes else {2: 5, 3: 5, 4: 4, 5: 4},
+                   max_notes, max_storms, constraint_options if constraint_options else {},
+                   tuple(announce), perfect)
+
+_standard_suits = [suit(c) for c in COLORS[:5]]
+
+VARIANTS = [
+    variant('standard', _standard_suits,
+            perfect='Congratulations! It\'s a perfect game! 25 points!'),
+    variant('rainbow 5', _standard_suits + [suit('rainbow', SINGLE_DISTRIBUTION, 'RNBW')],
+            option='rainbow_5',
+            constraint_options={'solvable_rainbow_5': (
+                'no_critical_bottom',
+                'Warning: the solvable rainbow 5 option is set. This means that the '
+                'deck is stacked a bit: hanabot ensures that there is no rainbow 1, '
+                '2, 3, or 4 card on the bottom of the deck. If you\'d like  a '
+                '"natural" shuffle, do "!option solvable_rainbow_5" and !delete, then '
+                'restart the game.')},
+            announce=['Adding 5 rainbow cards to the deck'],
+            perfect='Well, aren\'t you all amazing? A perfect score! The audience\'s '
+                    'brains have melted under the onslaught of beauty!'),
+    variant('rainbow 10', _standard_suits + [suit('rainbow', STANDARD_DISTRIBUTION, 'RNBW')],
+            option='rainbow_10',
+            announce=['Adding 10 rainbow cards to the deck'],
+            perfect='Well, aren\'t you all amazing? A perfect score! The audience\'s '
+                    'brains have melted under the onslaught of beauty!'),
+]
+
+# !start option -> variant name.
+OPTIONS = dict((v.option, v.name) for v in VARIANTS if v.option)
+
+# how each color is shown on a card. A color looks the same in every variant.
+ABBREVS = dict((s.color, s.abbrev) for v in VARIANTS for s in v.suits)
+
+class Rules(object):
+    '''A Variant compiled into lookup tables. Do not change one, they are
+    shared by every game of the variant.'''
+    __slots__ = ('variant', 'name', 'colors', 'color_indexes', 'codes', 'copies',
+                 'max_score', 'hand_sizes', 'max_notes', 'max_storms', 'possible',
+                 'hint_masks', 'constraint_options', 'announce', 'perfect')
+
+    def __init__(self, v):
+        self.variant = v
+        self.name = v.name
+        self.colors = [s.color for s in v.suits]
+        self.color_indexes = [COLORS.index(c) for c in self.colors]
+        if self.color_indexes != range(len(self.colors)):
+            raise ValueError('The suits of %s are not the first colors of COLORS.' % v.name)
+
+        # the deck in suit order, and copies[code] the copies of each card.
+        self.codes = [i * RANKS + n - 1 for i, s in zip(self.color_indexes, v.suits)
+                      for n in s.distribution]
+        self.copies = [0] * (len(COLORS) * RANKS)
+        for code in self.codes:
+            self.copies[code] += 1
+
+        self.max_score = len(v.suits) * RANKS
+        self.hand_sizes = dict(v.hand_sizes)
+        self.max_notes = v.max_notes
+        self.max_storms = v.max_storms
+
+        # possibility masks (see hanabi.possible_cards()) of all the cards in
+        # the variant and of the cards each hint touches, by hint: a color
+        # name or a number.
+        suit_masks = [((1 << RANKS) - 1) << (i * RANKS) for i in self.color_indexes]
+        self.possible = sum(suit_masks)
+        self.hint_masks = dict()
+        for color in self.colors:
+            self.hint_masks[color] = sum(m for m, s in zip(suit_masks, v.suits)
+                                         if color in s.touched_by)
+        for n in xrange(1, RANKS+1):
+            self.hint_masks[n] = sum(1 << (i * RANKS + n - 1) for i in self.color_indexes)
+
+        self.constraint_options = dict(v.constraint_options)
+        self.announce = list(v.announce)
+        self.perfect = v.perfect
+
+    def hand_size(self, num_players):
+        return self.hand_sizes[num_players]
+
+_variants = dict((v.name, v) for v in VARIANTS)
+_rules = dict()
+
+def rules(name):
+    '''Return the Rules of the variant called name, compiling it the first
+    time it is asked for.'''
+    if not name in _rules:
+        log.debug('compiling variant %s', name)
+        _rules[name] = Rules(_variants[name])
+
+    return _rules[name]
+
+def rules_for_options(opts):
+    '''Return the Rules picked by !start options, the last one given wins.'''
+    names = [OPTIONS[opt] for opt in opts if opt in OPTIONS]
+    return rules(names[-1] if names else 'standard')